@@ -1,64 +1,537 @@
 """Service for generating AI-based lifestyle content."""
 
-import google.generativeai as genai
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from metrics import registry
 import json
+import os
+import re
+import time
+
+LIFESTYLE_FIELDS = ("fact", "music", "music_explanation")
+
+
+class LifestyleCache:
+    """
+    TTL + LRU cache of AI lifestyle content.
+    
+    Keyed by (city, weather condition, temperature bucket, time of day), so
+    repeat views of a place under similar conditions reuse the same fact and
+    song instead of calling Gemini again. Optionally persisted to a JSON file.
+    """
+    
+    def __init__(self, ttl, max_entries, path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()  # key -> (stored_at, content)
+        self._load()
+    
+    @staticmethod
+    def make_key(city, weather_desc, temp, time_of_day):
+        """Normalize lookup parameters into a cache key."""
+        bucket = int(float(temp) // Config.AI_CACHE_TEMP_BUCKET)
+        return "|".join([
+            " ".join(str(city).split()).lower(),
+            str(weather_desc).strip().lower(),
+            str(bucket),
+            str(time_of_day).lower(),
+        ])
+    
+    def get(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        stored_at, content = item
+        if time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return content
+    
+    def put(self, key, content):
+        self._entries[key] = (time.time(), content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._save()
+    
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+            now = time.time()
+            for key, stored_at, content in rows[-self.max_entries:]:
+                if now - stored_at <= self.ttl:
+                    self._entries[key] = (stored_at, content)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"DEBUG: Could not load AI cache: {str(e)}")
+    
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            rows = [[key, stored_at, content] for key, (stored_at, content) in self._entries.items()]
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(rows, f)
+        except OSError as e:
+            print(f"DEBUG: Could not save AI cache: {str(e)}")
+
+
+class LifestyleFieldParser:
+    """
+    Incremental extractor for the lifestyle JSON fields.
+    
+    Feed it response text as it streams in; each of 'fact', 'music' and
+    'music_explanation' is returned as soon as its string value is closed,
+    without waiting for the rest of the object. Markdown fences, extra text
+    and truncated output only cost the fields that are actually missing.
+    """
+    
+    _FIELD_RE = re.compile(r'["\'](fact|music|music_explanation)["\']\s*:\s*"')
+    
+    def __init__(self):
+        self.buffer = ""
+        self.values = {}
+        self._pos = 0  # where to resume scanning for the next field
+    
+    def feed(self, text):
+        """Add text; return a list of (field, value) completed by it."""
+        self.buffer += text
+        found = []
+        while True:
+            match = self._FIELD_RE.search(self.buffer, self._pos)
+            if not match:
+                break
+            end = self._string_end(match.end())
+            if end is None:
+                break  # value still streaming in
+            
+            raw = self.buffer[match.end() - 1:end + 1]
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                value = raw[1:-1]
+            self._pos = end + 1
+            
+            field = match.group(1)
+            if field not in self.values and value.strip():
+                self.values[field] = value.strip()
+                found.append((field, self.values[field]))
+        return found
+    
+    def finish(self):
+        """Parse the complete text for any fields the scanner could not pick up."""
+        text = self.buffer.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return []
+        
+        found = []
+        if isinstance(data, dict):
+            for field in LIFESTYLE_FIELDS:
+                value = data.get(field)
+                if field not in self.values and isinstance(value, str) and value.strip():
+                    self.values[field] = value.strip()
+                    found.append((field, self.values[field]))
+        return found
+    
+    def _string_end(self, start):
+        """Index of the quote closing a JSON string starting at `start`, or None."""
+        i = start
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == "\\":
+                i += 2
+                continue
+            if char == '"':
+                return i
+            i += 1
+        return None
+
 
 class AIService:
     """Service to interact with Google Gemini API."""
     
     def __init__(self):
         self.api_key = Config.GEMINI_API_KEY
-        self.model = None
-        
-        if self.api_key:
+        self._model = None  # created off the event loop (see warm_up)
+        self._loading = None  # shared future of the SDK load
+        self._unavailable = False  # the SDK failed to load
+        # Only used if the SDK has no async API
+        self._executor = None
+        self.cache = LifestyleCache(
+            ttl=Config.AI_CACHE_TTL,
+            max_entries=Config.AI_CACHE_MAX_ENTRIES,
+            path=Config.AI_CACHE_PATH,
+        )
+
+    @property
+    def enabled(self):
+        """Whether AI content can be requested (without loading the SDK)."""
+        return self._model is not None or (bool(self.api_key) and not self._unavailable)
+
+    @property
+    def model(self):
+        """Gemini model, or None until warm_up() has loaded it."""
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
+    def _load_model(self):
+        """Import the Gemini SDK and create the model (blocking; see warm_up)."""
+        try:
+            import google.generativeai as genai
             genai.configure(api_key=self.api_key)
             # Updated model to match your curl command which is working
-            self.model = genai.GenerativeModel('gemini-2.0-flash')
+            self._model = genai.GenerativeModel('gemini-2.0-flash')
+        except Exception as e:
+            print(f"DEBUG: Gemini SDK unavailable: {str(e)}")
+            self._unavailable = True
 
-    async def generate_lifestyle_content(self, weather_desc, temp, city, time_of_day="day"):
-        """
-        Generate trivia and music based on weather and time using AI.
-        Returns a dict with 'fact', 'music', and 'music_explanation'.
+    async def warm_up(self):
+        """Load the Gemini SDK and model in a worker thread, off the event loop.
+        
+        The load runs once; every caller awaits the same one.
         """
-        # Fallback content in case AI fails or key is missing
-        fallback = {
+        if self._model is not None or not self.enabled:
+            return
+        if self._loading is None:
+            self._loading = asyncio.get_running_loop().run_in_executor(None, self._load_model)
+        # A cancelled caller must not cancel the load for the others
+        await asyncio.shield(self._loading)
+
+    async def _ready(self):
+        """Whether the model can be used, waiting for warm_up() if needed."""
+        if not self.enabled:
+            return False
+        await self.warm_up()
+        return self._model is not None
+
+    @staticmethod
+    def _fallback(city):
+        """Fallback content in case AI fails or key is missing."""
+        return {
             "fact": f"Did you know? Weather in {city} is quite unique today.",
             "music": "Here Comes The Sun - The Beatles",
             "music_explanation": "A classic for any day."
         }
 
-        if not self.model:
+    def _cached(self, cache_key):
+        """Cache lookup that records hits and misses."""
+        content = self.cache.get(cache_key)
+        registry.counter("ai.cache.hits" if content else "ai.cache.misses").inc()
+        return content
+
+    @staticmethod
+    def _record_usage(response):
+        """Add the token counts from a Gemini response's usage_metadata."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        registry.counter("ai.tokens.prompt").inc(getattr(usage, "prompt_token_count", 0) or 0)
+        registry.counter("ai.tokens.response").inc(getattr(usage, "candidates_token_count", 0) or 0)
+
+    @staticmethod
+    def _with_fallback(fallback, values=None):
+        """Merge AI fields over the fallback content, counting when it was needed."""
+        values = values or {}
+        if fallback and len(values) < len(LIFESTYLE_FIELDS):
+            registry.counter("ai.fallbacks").inc()
+        return {**fallback, **values} or None
+
+    def stats(self):
+        """
+        Snapshot of the AI metrics.
+        
+        Counters: ai.calls (Gemini requests; ai.calls.stream and
+        ai.calls.batch are subsets), ai.timeouts, ai.errors,
+        ai.parse_failures (responses missing fields), ai.fallbacks
+        (results padded with fallback content), ai.tokens.prompt,
+        ai.tokens.response, ai.cache.hits/misses and ai.outcome.* (which
+        path filled the cards in the app). Histograms: ai.latency,
+        ai.batch.latency, ai.stream.first_field_latency and
+        ai.outcome_latency (until the cards settled), in seconds.
+        """
+        snapshot = registry.snapshot("ai.")
+        hits = registry.value("ai.cache.hits")
+        lookups = hits + registry.value("ai.cache.misses")
+        snapshot["cache_hit_ratio"] = round(hits / lookups, 3) if lookups else None
+        return snapshot
+
+    @staticmethod
+    def _build_prompt(weather_desc, temp, city, time_of_day):
+        # UPDATED PROMPT AS REQUESTED
+        return (
+            f"It is currently {time_of_day} in {city}. The weather is {weather_desc} and {temp} degrees Celsius. "
+            "Give me a JSON response with three fields: "
+            f"'fact' (a short and specific, scientific or historical trivia related to a {weather_desc} weather or to {city}), "
+            "'music' (a song title and artist that stricty matches the vibe of this weather, time of day, the location, or combination of them), "
+            "and 'music_explanation' (a very short, 1-sentence explanation of why this song fits the current weather and time). " 
+            "Base the song choice on what you would feel normally on this kind of weather and time. "
+            "Do not use markdown formatting."
+        )
+
+    @staticmethod
+    def _build_batch_prompt(items):
+        situations = "\n".join(
+            f"{i}. It is {time_of_day} in {city}. The weather is {weather_desc} and {temp} degrees Celsius."
+            for i, (city, weather_desc, temp, time_of_day) in enumerate(items)
+        )
+        return (
+            "For each numbered situation below, give me trivia and a song. "
+            "Respond with a JSON array containing one object per situation, in the same order, with four fields: "
+            "'index' (the situation number), "
+            "'fact' (a short and specific, scientific or historical trivia related to that weather or city), "
+            "'music' (a song title and artist that stricty matches the vibe of that weather, time of day, the location, or combination of them), "
+            "and 'music_explanation' (a very short, 1-sentence explanation of why this song fits). "
+            "Do not use markdown formatting.\n\n"
+            + situations
+        )
+
+    @staticmethod
+    def _parse_batch(text, count):
+        """Map a JSON array response onto situation indices; bad entries are skipped."""
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end < start:
+            return {}
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            return {}
+        if not isinstance(data, list):
+            return {}
+        
+        results = {}
+        for position, entry in enumerate(data):
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get("index", position)
+            if not isinstance(index, int) or not 0 <= index < count:
+                continue
+            content = {
+                field: entry[field].strip() for field in LIFESTYLE_FIELDS
+                if isinstance(entry.get(field), str) and entry[field].strip()
+            }
+            if len(content) == len(LIFESTYLE_FIELDS):
+                results[index] = content
+        return results
+
+    async def generate_lifestyle_batch(self, items):
+        """
+        Generate trivia and music for several places or days in one request.
+        `items` is a list of (city, weather_desc, temp, time_of_day) tuples.
+        Returns a list of dicts (same order) with 'fact', 'music', and
+        'music_explanation'. Cached items are not requested again; the rest
+        share one prompt per Config.AI_BATCH_SIZE items, and each result is
+        cached under its own key.
+        """
+        results = [self._fallback(city) for city, *_ in items]
+        
+        pending = []
+        for i, (city, weather_desc, temp, time_of_day) in enumerate(items):
+            cache_key = self.cache.make_key(city, weather_desc, temp, time_of_day)
+            cached = self._cached(cache_key)
+            if cached:
+                results[i] = cached
+            else:
+                pending.append((i, cache_key))
+        if pending and not await self._ready():
+            pending = []
+        
+        # Same conditions requested twice only need asking once
+        unique_keys = list(dict.fromkeys(key for _, key in pending))
+        batch_items = {key: items[i] for i, key in pending}
+        
+        for start in range(0, len(unique_keys), Config.AI_BATCH_SIZE):
+            chunk = unique_keys[start:start + Config.AI_BATCH_SIZE]
+            try:
+                prompt = self._build_batch_prompt([batch_items[key] for key in chunk])
+                print(f"DEBUG: AI Batch Prompt: {len(chunk)} items")
+                registry.counter("ai.calls").inc()
+                registry.counter("ai.calls.batch").inc()
+                started = time.monotonic()
+                
+                response = await asyncio.wait_for(
+                    self._generate(prompt), timeout=Config.AI_BATCH_TIMEOUT
+                )
+                registry.histogram("ai.batch.latency").observe(time.monotonic() - started)
+                self._record_usage(response)
+                
+                parsed = self._parse_batch(response.text, len(chunk))
+                registry.counter("ai.parse_failures").inc(len(chunk) - len(parsed))
+                for index, content in parsed.items():
+                    self.cache.put(chunk[index], content)
+            except asyncio.TimeoutError:
+                print(f"DEBUG: AI batch timed out after {Config.AI_BATCH_TIMEOUT}s")
+                registry.counter("ai.timeouts").inc()
+            except Exception as e:
+                print(f"DEBUG: AI Batch Error: {str(e)}")
+                registry.counter("ai.errors").inc()
+        
+        for i, cache_key in pending:
+            content = self.cache.get(cache_key)
+            if content:
+                results[i] = content
+            else:
+                registry.counter("ai.fallbacks").inc()
+        return results
+
+    async def generate_lifestyle_content(self, weather_desc, temp, city, time_of_day="day", use_fallback=True):
+        """
+        Generate trivia and music based on weather and time using AI.
+        Returns a dict with 'fact', 'music', and 'music_explanation'.
+        With use_fallback=False only fields the AI produced are returned,
+        and None if it produced nothing (the caller has its own fallback).
+        """
+        fallback = self._fallback(city) if use_fallback else {}
+
+        # Same place and similar conditions: reuse earlier content
+        cache_key = self.cache.make_key(city, weather_desc, temp, time_of_day)
+        cached = self._cached(cache_key)
+        if cached:
+            return cached
+
+        if not await self._ready():
             print("DEBUG: AI Model not initialized. Check API Key.")
-            return fallback
+            return self._with_fallback(fallback)
 
         try:
-            # UPDATED PROMPT AS REQUESTED
-            prompt = (
-                f"It is currently {time_of_day} in {city}. The weather is {weather_desc} and {temp} degrees Celsius. "
-                "Give me a JSON response with three fields: "
-                f"'fact' (a short and specific, scientific or historical trivia related to a {weather_desc} weather or to {city}), "
-                "'music' (a song title and artist that stricty matches the vibe of this weather, time of day, the location, or combination of them), "
-                "and 'music_explanation' (a very short, 1-sentence explanation of why this song fits the current weather and time). " 
-                "Base the song choice on what you would feel normally on this kind of weather and time. "
-                "Do not use markdown formatting."
-            )
+            prompt = self._build_prompt(weather_desc, temp, city, time_of_day)
             print(f"DEBUG: AI Prompt: {time_of_day} | {city} | {weather_desc} | {temp}")
+            registry.counter("ai.calls").inc()
+            started = time.monotonic()
             
-            # Generate content
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
+            # Generate content without blocking the event loop
+            response = await asyncio.wait_for(self._generate(prompt), timeout=Config.AI_TIMEOUT)
+            registry.histogram("ai.latency").observe(time.monotonic() - started)
+            self._record_usage(response)
             
-            # Clean up potential markdown code blocks from response
-            if text.startswith("```json"):
-                text = text[7:-3]
-            elif text.startswith("```"):
-                text = text[3:-3]
-            
-            # Parse JSON
-            data = json.loads(text)
-            return data
+            # Parse field by field; anything missing falls back individually
+            parser = LifestyleFieldParser()
+            parser.feed(response.text)
+            parser.finish()
+            if len(parser.values) == len(LIFESTYLE_FIELDS):
+                self.cache.put(cache_key, parser.values)
+            else:
+                registry.counter("ai.parse_failures").inc()
+                print(f"DEBUG: AI response missing fields: {response.text[:200]!r}")
+            return self._with_fallback(fallback, parser.values)
             
+        except asyncio.TimeoutError:
+            print(f"DEBUG: AI Generation timed out after {Config.AI_TIMEOUT}s")
+            registry.counter("ai.timeouts").inc()
+            return self._with_fallback(fallback)
         except Exception as e:
             print(f"DEBUG: AI Generation Error: {str(e)}")
-            return fallback
\ No newline at end of file
+            registry.counter("ai.errors").inc()
+            return self._with_fallback(fallback)
+
+    async def stream_lifestyle_content(self, weather_desc, temp, city, time_of_day="day", use_fallback=True):
+        """
+        Stream trivia and music fields as Gemini generates them.
+        
+        Async generator yielding (field, value) pairs for 'fact', 'music'
+        and 'music_explanation', each as soon as it is complete. Fields the
+        model does not deliver within Config.AI_TIMEOUT (or delivers
+        malformed) are yielded from the fallback content at the end,
+        unless use_fallback is False.
+        """
+        fallback = self._fallback(city) if use_fallback else {}
+        
+        cache_key = self.cache.make_key(city, weather_desc, temp, time_of_day)
+        cached = self.cache.get(cache_key)
+        if cached:
+            registry.counter("ai.cache.hits").inc()
+            content = {**fallback, **cached}
+            for field in LIFESTYLE_FIELDS:
+                if field in content:
+                    yield field, content[field]
+            return
+        
+        if not await self._ready() or not hasattr(self.model, "generate_content_async"):
+            # No streaming available: deliver the whole result at once
+            data = await self.generate_lifestyle_content(weather_desc, temp, city, time_of_day, use_fallback)
+            for field in LIFESTYLE_FIELDS:
+                if data and field in data:
+                    yield field, data[field]
+            return
+        registry.counter("ai.cache.misses").inc()
+        
+        parser = LifestyleFieldParser()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + Config.AI_TIMEOUT
+        try:
+            prompt = self._build_prompt(weather_desc, temp, city, time_of_day)
+            print(f"DEBUG: AI Prompt (stream): {time_of_day} | {city} | {weather_desc} | {temp}")
+            registry.counter("ai.calls").inc()
+            registry.counter("ai.calls.stream").inc()
+            
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(prompt, stream=True),
+                timeout=deadline - loop.time(),
+            )
+            chunks = response.__aiter__()
+            chunk = None
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(
+                        chunks.__anext__(), timeout=max(0, deadline - loop.time())
+                    )
+                except StopAsyncIteration:
+                    break
+                found = parser.feed(chunk.text)
+                if found and len(parser.values) == len(found):
+                    registry.histogram("ai.stream.first_field_latency").observe(loop.time() - started)
+                for field, value in found:
+                    yield field, value
+            
+            registry.histogram("ai.latency").observe(loop.time() - started)
+            # The final chunk carries the usage totals
+            self._record_usage(chunk)
+            for field, value in parser.finish():
+                yield field, value
+            if len(parser.values) < len(LIFESTYLE_FIELDS):
+                registry.counter("ai.parse_failures").inc()
+        
+        except asyncio.TimeoutError:
+            print(f"DEBUG: AI stream timed out after {Config.AI_TIMEOUT}s")
+            registry.counter("ai.timeouts").inc()
+        except Exception as e:
+            print(f"DEBUG: AI Stream Error: {str(e)}")
+            registry.counter("ai.errors").inc()
+        
+        if len(parser.values) == len(LIFESTYLE_FIELDS):
+            self.cache.put(cache_key, parser.values)
+        elif fallback:
+            registry.counter("ai.fallbacks").inc()
+        for field in LIFESTYLE_FIELDS:
+            if field not in parser.values and field in fallback:
+                yield field, fallback[field]
+
+    async def _generate(self, prompt):
+        """Run a Gemini request off the event loop.
+        
+        Uses the SDK's async API; older SDKs without it fall back to a small
+        dedicated thread pool. Cancelling the await cancels the async request
+        (a pooled thread runs to completion but its result is dropped).
+        """
+        if hasattr(self.model, "generate_content_async"):
+            return await self.model.generate_content_async(prompt)
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=Config.AI_MAX_WORKERS, thread_name_prefix="gemini"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.model.generate_content, prompt)
\ No newline at end of file
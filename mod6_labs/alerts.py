@@ -0,0 +1,154 @@
+# alerts.py
+"""Table-driven weather alerts over current conditions and the forecast."""
+
+import datetime
+import operator
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+from config import Config
+from forecast import Forecast
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+
+class AlertRule(NamedTuple):
+    """
+    One declarative alert condition.
+
+    Thresholds are in the units the data is fetched in (units=metric).
+    `message` is a str.format template with `value` (the reading) and
+    `when` ("now" or "expected Thursday 03:00").
+    """
+    name: str
+    metric: str  # 'temp' (°C), 'wind' (m/s), 'precip' (mm) or 'condition'
+    op: str  # key of OPERATORS
+    threshold: Any
+    severity: int  # higher ranks first
+    message: str
+    group: str = ""  # rules in one group are alternatives; only the most severe is shown
+
+
+class Alert(NamedTuple):
+    """A rule that fired, now or at a forecast sample."""
+    rule: AlertRule
+    value: Any
+    time: Optional[int]  # UTC epoch seconds of the forecast sample, None if current
+    message: str
+
+    @property
+    def upcoming(self) -> bool:
+        return self.time is not None
+
+
+ALERT_RULES = (
+    AlertRule("extreme_heat", "temp", ">", 35, 5,
+              "🔥 Extreme heat {when} ({value:.1f}°C). Wear sunscreen.", "heat"),
+    AlertRule("high_temp", "temp", ">", 30, 4,
+              "☀️ High temperature {when} ({value:.1f}°C). Stay hydrated.", "heat"),
+    AlertRule("freeze", "temp", "<", 5, 3,
+              "❄️ Freeze {when} ({value:.1f}°C)"),
+    AlertRule("high_wind", "wind", ">", 15, 2,
+              "💨 High wind {when} ({value:.1f} m/s)"),
+    AlertRule("rain", "condition", "==", "Rain", 1,
+              "🌧️ Rain {when}. Bring an umbrella!"),
+)
+
+
+class AlertEngine:
+    """
+    Evaluates a fixed table of alert rules.
+
+    Rules are compiled once (operator lookup and validation). Each fetch
+    is then checked with one scan per rule over the matching forecast
+    column, stopping at the first sample that fires, so the cost is a few
+    comparisons per sample whatever the number of alerts raised.
+    """
+
+    METRICS = ("temp", "wind", "precip", "condition")
+
+    def __init__(self, rules: Sequence[AlertRule] = ALERT_RULES):
+        """
+        Args:
+            rules: Alert rules to evaluate
+
+        Raises:
+            ValueError: If a rule names an unknown metric or operator
+        """
+        self._rules = []
+        for rule in rules:
+            if rule.metric not in self.METRICS:
+                raise ValueError(f"Alert rule {rule.name!r}: unknown metric {rule.metric!r}")
+            if rule.op not in OPERATORS:
+                raise ValueError(f"Alert rule {rule.name!r}: unknown operator {rule.op!r}")
+            self._rules.append((rule, OPERATORS[rule.op]))
+
+    @staticmethod
+    def current_reading(data: Dict) -> Dict[str, Any]:
+        """Metric values from a /weather payload."""
+        return {
+            "temp": data.get("main", {}).get("temp", 0),
+            "wind": data.get("wind", {}).get("speed", 0),
+            "precip": data.get("rain", {}).get("1h", 0.0) + data.get("snow", {}).get("1h", 0.0),
+            "condition": (data.get("weather") or [{}])[0].get("main", ""),
+        }
+
+    @staticmethod
+    def _columns(forecast: Forecast) -> Dict[str, Sequence]:
+        return {
+            "temp": forecast.temps,
+            "wind": forecast.wind,
+            "precip": forecast.precip,
+            "condition": forecast.conditions,
+        }
+
+    def evaluate(self, data: Dict, forecast: Optional[Forecast] = None) -> List[Alert]:
+        """
+        Check every rule against current conditions and the forecast.
+
+        Args:
+            data: Current weather payload
+            forecast: Forecast model of the same place, if available
+
+        Returns:
+            Alerts ranked by severity, current before upcoming, then by
+            time. For each rule group only the most severe current alert and
+            the most severe upcoming one are kept, and an upcoming alert is
+            dropped when a current one of the group is at least as severe.
+        """
+        reading = self.current_reading(data)
+        columns = self._columns(forecast) if forecast else None
+        timezone_offset = data.get("timezone", forecast.timezone if forecast else 0)
+
+        alerts = []
+        for rule, compare in self._rules:
+            value = reading[rule.metric]
+            if compare(value, rule.threshold):
+                alerts.append(Alert(rule, value, None, rule.message.format(value=value, when="now")))
+                continue
+            if columns is None:
+                continue
+
+            column = columns[rule.metric]
+            i = next((i for i, v in enumerate(column) if compare(v, rule.threshold)), None)
+            if i is not None:
+                time = forecast.times[i]
+                when = datetime.datetime.utcfromtimestamp(time + timezone_offset).strftime("expected %A %H:%M")
+                alerts.append(Alert(rule, column[i], time, rule.message.format(value=column[i], when=when)))
+
+        alerts.sort(key=lambda a: (-a.rule.severity, a.upcoming, a.time or 0))
+
+        best: Dict[tuple, Alert] = {}
+        for alert in alerts:
+            best.setdefault((alert.rule.group or alert.rule.name, alert.upcoming), alert)
+        ranked = []
+        for (group, upcoming), alert in best.items():
+            current = best.get((group, False))
+            if upcoming and current and current.rule.severity >= alert.rule.severity:
+                continue
+            ranked.append(alert)
+        return ranked[:Config.ALERT_MAX]
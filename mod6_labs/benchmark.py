@@ -0,0 +1,428 @@
+# benchmark.py
+"""
+Latency benchmarks for the weather pipeline against a local OWM stub.
+
+Runs WeatherService and WeatherApp.get_weather against recorded
+OpenWeatherMap / ipapi payloads (benchmark_data/) served through an
+httpx.MockTransport with configurable delay and error rate, on a
+headless Flet page. No network access or API keys are needed.
+
+Usage (from mod6_labs/):
+    python benchmark.py                  # run and compare with the baseline
+    python benchmark.py --save-baseline  # record a new baseline
+    python benchmark.py --check          # exit with 1 on a regression
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import gc
+import gzip
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List
+
+# The app refuses to start without an OWM key; the stub ignores it
+os.environ.setdefault("OPENWEATHER_API_KEY", "benchmark")
+
+import flet as ft
+import httpx
+from flet.core.connection import Connection
+from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+
+from config import Config
+from weather_service import WeatherService
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_data")
+BASELINE_PATH = os.path.join(DATA_DIR, "baseline.json")
+
+STATIC_ENDPOINTS = ("icon", "city_list")  # served by the stub, not counted as API requests
+
+CITIES = [
+    "Paris", "Berlin", "Madrid", "Rome", "Vienna", "Prague", "Warsaw", "Oslo",
+    "Lisbon", "Dublin", "Athens", "Helsinki", "Zurich", "Brussels", "Amsterdam",
+    "Budapest", "Copenhagen", "Stockholm", "Manila", "Tokyo",
+]
+
+
+class OWMStub:
+    """
+    In-process stand-in for api.openweathermap.org and ipapi.co.
+
+    Serves the recorded payloads, rewritten per city so every city gets
+    its own ID, name and coordinates. Each request waits `delay` seconds
+    (IP geolocation another `ipapi_delay`), fails with a 503 with
+    probability `error_rate`, and raises a connect error while `offline`
+    is set.
+
+    Weather icons and the city list (static files the app downloads once)
+    are served too, but are counted apart from the API requests.
+    """
+
+    def __init__(self, delay: float = 0.02, error_rate: float = 0.0, seed: int = 1):
+        self.delay = delay
+        self.error_rate = error_rate
+        self.ipapi_delay = 0.0
+        self.offline = False
+        self.requests = Counter()
+        self._random = random.Random(seed)
+
+        self._payloads = {}
+        for name in ("weather", "forecast", "ipapi"):
+            with open(os.path.join(DATA_DIR, f"{name}.json")) as f:
+                self._payloads[name] = json.load(f)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    @staticmethod
+    def _place(params: httpx.QueryParams) -> Dict:
+        """Deterministic id/name/coord for the place a request asks for."""
+        if "lat" in params:
+            lat, lon = float(params["lat"]), float(params["lon"])
+            seed = f"{lat:.2f},{lon:.2f}"
+            name = f"Place {seed}"
+        else:
+            seed = params.get("q") or params.get("id")
+            name = seed.title() if params.get("q") else f"City {seed}"
+            h = zlib.crc32(seed.lower().encode())
+            lat = (h % 12000) / 100 - 60
+            lon = (h // 12000 % 34000) / 100 - 170
+        city_id = params.get("id") or 1000000 + zlib.crc32(seed.lower().encode()) % 9000000
+        return {"id": int(city_id), "name": name, "coord": {"lat": lat, "lon": lon}}
+
+    def _weather(self, place: Dict) -> Dict:
+        data = dict(self._payloads["weather"])
+        data.update(place)
+        return data
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        endpoint = "ipapi" if "ipapi" in request.url.host else request.url.path.rsplit("/", 1)[-1]
+        if endpoint.endswith(".png"):
+            endpoint = "icon"
+        elif endpoint.startswith("city.list"):
+            endpoint = "city_list"
+        self.requests[endpoint] += 1
+
+        if self.offline:
+            raise httpx.ConnectError("stub is offline", request=request)
+        await asyncio.sleep(self.delay)
+        if self._random.random() < self.error_rate:
+            return httpx.Response(503, json={"cod": 503})
+
+        params = request.url.params
+        if endpoint == "icon":
+            return httpx.Response(200, content=b"\x89PNG\r\n\x1a\n")
+        if endpoint == "city_list":
+            cities = [{**self._place(httpx.QueryParams({"q": city})), "country": "XX"} for city in CITIES]
+            return httpx.Response(200, content=gzip.compress(json.dumps(cities).encode()))
+        if endpoint == "ipapi":
+            await asyncio.sleep(self.ipapi_delay)
+            return httpx.Response(200, json=self._payloads["ipapi"])
+        if params.get("q", "").lower() == "nowhere":
+            return httpx.Response(404, json={"cod": "404", "message": "city not found"})
+        if endpoint == "group":
+            ids = params["id"].split(",")
+            items = [self._weather(self._place(httpx.QueryParams({"id": i}))) for i in ids]
+            return httpx.Response(200, json={"cnt": len(items), "list": items})
+        if endpoint == "forecast":
+            place = self._place(params)
+            data = dict(self._payloads["forecast"])
+            data["city"] = {**data["city"], **place}
+            return httpx.Response(200, json=data)
+        return httpx.Response(200, json=self._weather(self._place(params)))
+
+    @property
+    def total_requests(self) -> int:
+        """API requests (ipapi and OWM), not static files."""
+        return sum(n for endpoint, n in self.requests.items() if endpoint not in STATIC_ENDPOINTS)
+
+
+class HeadlessConnection(Connection):
+    """Flet connection that accepts every command without a client."""
+
+    def __init__(self):
+        super().__init__()
+        self._ids = itertools.count(1)
+        self.batches = 0
+
+    def send_commands(self, session_id, commands):
+        self.batches += 1
+        results = []
+        for command in commands:
+            if command.name == "add":
+                results.append(" ".join(f"_{next(self._ids)}" for _ in command.commands))
+        return PageCommandsBatchResponsePayload(results=results, error="")
+
+    def send_command(self, session_id, command):
+        return PageCommandResponsePayload(result="", error="")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def timed(samples: List[float], awaitable):
+    started = time.perf_counter()
+    try:
+        await awaitable
+    finally:
+        samples.append(time.perf_counter() - started)
+
+
+async def settle(timeout: float = 5.0):
+    """Wait for background tasks (startup lookups, refreshes) to finish."""
+    current = asyncio.current_task()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # Page.run_task schedules thread-safely, so give callbacks a turn first
+        await asyncio.sleep(0.01)
+        pending = [t for t in asyncio.all_tasks() if t is not current and not t.done()]
+        if not pending:
+            return
+
+
+def make_app(stub: OWMStub, cache_path: str):
+    """WeatherApp on a headless page, wired to the stub."""
+    import main as app_module
+
+    Config.CACHE_PATH = cache_path
+    # Icons and the city index go next to the cache, not into the app directory
+    workdir = os.path.dirname(cache_path)
+    Config.ASSETS_DIR = os.path.join(workdir, "assets")
+    Config.CITY_INDEX_PATH = os.path.join(workdir, "city_index.bin")
+    page = ft.Page(HeadlessConnection(), "benchmark", loop=asyncio.get_running_loop())
+    return app_module.WeatherApp(page, weather_service=WeatherService(transport=stub.transport()))
+
+
+# --- Scenarios ---
+# Each returns per-call latency samples (seconds); requests are counted by the stub.
+
+async def scenario_service_cold(stub: OWMStub, workdir: str) -> List[float]:
+    """Weather + forecast for distinct cities straight from WeatherService."""
+    service = WeatherService(transport=stub.transport())
+    samples = []
+    for city in CITIES:
+        await timed(samples, asyncio.gather(service.get_weather(city), service.get_forecast(city)))
+    await service.close()
+    return samples
+
+
+async def scenario_app_cold(stub: OWMStub, workdir: str) -> List[float]:
+    """WeatherApp.get_weather for distinct cities with an empty cache."""
+    app = make_app(stub, os.path.join(workdir, "cold.db"))
+    await settle()
+    stub.requests.clear()
+
+    samples = []
+    for city in CITIES:
+        await timed(samples, app.get_weather(city))
+    await app.on_page_close(None)
+    return samples
+
+
+async def scenario_app_warm(stub: OWMStub, workdir: str) -> List[float]:
+    """WeatherApp.get_weather for cities already in the cache."""
+    app = make_app(stub, os.path.join(workdir, "warm.db"))
+    for city in CITIES:
+        await app.get_weather(city)
+    await settle()
+    stub.requests.clear()
+
+    samples = []
+    for city in CITIES:
+        await timed(samples, app.get_weather(city))
+    await app.on_page_close(None)
+    return samples
+
+
+async def scenario_app_offline(stub: OWMStub, workdir: str) -> List[float]:
+    """Network down: every lookup falls back to (expired) cached data."""
+    app = make_app(stub, os.path.join(workdir, "offline.db"))
+    for city in CITIES:
+        await app.get_weather(city)
+    await settle()
+    stub.requests.clear()
+
+    stub.offline = True
+    app.CACHE_DURATION = datetime.timedelta(0)
+    app.CACHE_STALE_DURATION = datetime.timedelta(0)
+    samples = []
+    for city in CITIES:
+        await timed(samples, app.get_weather(city))
+    await app.on_page_close(None)
+    return samples
+
+
+async def scenario_app_startup(stub: OWMStub, workdir: str) -> List[float]:
+    """Launch to first weather paint, with a known last location and slow geolocation."""
+    path = os.path.join(workdir, "startup.db")
+    app = make_app(stub, path)  # first launch detects and remembers the location
+    await settle()
+    await app.on_page_close(None)
+    stub.requests.clear()
+
+    stub.ipapi_delay = 0.5
+    samples = []
+    for _ in range(20):  # with 20 samples one stray pause is not the p95
+        started = time.perf_counter()
+        app = make_app(stub, path)
+        while app.displayed_key is None and time.perf_counter() - started < 10:
+            await asyncio.sleep(0.005)
+        samples.append(time.perf_counter() - started)
+        await settle()
+        await app.on_page_close(None)
+    return samples
+
+
+async def scenario_burst(stub: OWMStub, workdir: str) -> List[float]:
+    """100 concurrent lookups spread over 5 cities."""
+    service = WeatherService(transport=stub.transport())
+    samples = []
+    await asyncio.gather(*(
+        timed(samples, service.get_weather(CITIES[i % 5])) for i in range(100)
+    ))
+    await service.close()
+    return samples
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "service_cold": scenario_service_cold,
+    "app_cold": scenario_app_cold,
+    "app_warm": scenario_app_warm,
+    "app_offline": scenario_app_offline,
+    "app_startup": scenario_app_startup,
+    "burst": scenario_burst,
+}
+
+
+async def run_scenario(name: str, args) -> Dict:
+    """Run one scenario twice: once for latency, once under tracemalloc."""
+    scenario = SCENARIOS[name]
+    results = {}
+
+    for trace in (False, True):
+        stub = OWMStub(delay=args.delay, error_rate=args.error_rate, seed=args.seed)
+        with tempfile.TemporaryDirectory() as workdir, \
+                contextlib.redirect_stdout(io.StringIO()):
+            # Collect what earlier scenarios left behind, so a full
+            # collection does not land in this one's few samples
+            gc.collect()
+            if trace:
+                tracemalloc.start()
+            samples = await scenario(stub, workdir)
+            await settle()
+            if trace:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results["peak_kib"] = round(peak / 1024, 1)
+            else:
+                results.update({
+                    "n": len(samples),
+                    "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                    "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                    "p99_ms": round(percentile(samples, 99) * 1000, 2),
+                    "requests": stub.total_requests,
+                })
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Describe regressions against the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["requests"] > base["requests"]:
+            regressions.append(f"{name}: requests {base['requests']} -> {result['requests']}")
+        limit = base["p95_ms"] * (1 + tolerance) + 2  # 2 ms floor for timer noise
+        if result["p95_ms"] > limit:
+            regressions.append(f"{name}: p95 {base['p95_ms']} ms -> {result['p95_ms']} ms")
+    return regressions
+
+
+def print_report(results: Dict, baseline: Dict):
+    header = f"{'scenario':<14}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'requests':>10}{'peak KiB':>10}{'p95 vs base':>13}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        delta = ""
+        base = baseline.get(name)
+        if base and base["p95_ms"]:
+            delta = f"{(r['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100:+.0f}%"
+        print(
+            f"{name:<14}{r['n']:>5}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+            f"{r['p99_ms']:>10.2f}{r['requests']:>10}{r['peak_kib']:>10.1f}{delta:>13}"
+        )
+
+
+async def main_async(args) -> int:
+    # Measure the pipeline itself, not the OWM quota, unless asked to
+    if not args.real_quota:
+        Config.RATE_LIMIT_PER_MINUTE = 10 ** 6
+        Config.RATE_LIMIT_BURST = 10 ** 6
+    # Keep Gemini out of the measurements
+    Config.GEMINI_API_KEY = None
+
+    names = args.scenario or list(SCENARIOS)
+    results = {}
+    for name in names:
+        results[name] = await run_scenario(name, args)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f).get("scenarios", {})
+
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({
+                "settings": {"delay": args.delay, "error_rate": args.error_rate, "seed": args.seed},
+                "scenarios": results,
+            }, f, indent=2)
+        print(f"\nBaseline saved to {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1 if args.check else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="run only this scenario (repeatable)")
+    parser.add_argument("--delay", type=float, default=0.02, help="stub response delay in seconds (default 0.02)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that are 503s")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the stub")
+    parser.add_argument("--real-quota", action="store_true", help="keep the configured OWM rate limit")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown vs baseline (default 0.25)")
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
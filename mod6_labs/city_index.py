@@ -0,0 +1,483 @@
+# city_index.py
+"""
+Offline city name index for search suggestions.
+
+Built from the OpenWeatherMap city list (city.list.json.gz, ~200k
+cities) into one compact file that is memory-mapped on first use.
+Suggestions resolve to OWM city IDs, so a picked city is looked up
+unambiguously and always lands on the same cache entry.
+
+Usage (from mod6_labs/):
+    python city_index.py                      # download the city list and build
+    python city_index.py city.list.json.gz    # build from a local copy
+"""
+
+import argparse
+import bisect
+import gzip
+import heapq
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+from config import Config
+
+MAGIC = b"CITYIDX1"
+_HEADER = struct.Struct("<8sII")  # magic, city count, key width
+KEY_WIDTH = 16  # bytes of each normalized name kept in the sorted key table
+FUZZY_WIDTH = 8  # leading bytes of the query matched with typos allowed
+
+
+class Suggestion(NamedTuple):
+    """One suggested city."""
+    city_id: int
+    label: str  # "London, GB" / "Springfield, IL, US"
+    distance: int  # edits between the query and the name (0 for prefix matches)
+
+
+def normalize(name: str) -> str:
+    """Search key for a name: accents stripped, case-folded, spaces collapsed."""
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def _key(name: str) -> bytes:
+    return normalize(name).encode("utf-8")
+
+
+def build(cities: Iterable[Dict], path: str) -> int:
+    """
+    Write an index file from OWM city list entries.
+
+    Layout (little-endian): header, then the sorted key table (each
+    normalized name truncated or NUL-padded to KEY_WIDTH bytes), the
+    city IDs, record offsets, and the records ("<full key>\\t<label>").
+
+    Args:
+        cities: Entries with 'id', 'name', 'country' and optional 'state'
+        path: Output file (replaced atomically)
+
+    Returns:
+        Number of cities written
+    """
+    rows = []
+    for city in cities:
+        name = (city.get("name") or "").strip()
+        if not name or not city.get("id"):
+            continue
+        parts = [name, city.get("state") or "", city.get("country") or ""]
+        label = ", ".join(p for p in parts if p)
+        rows.append((_key(name), int(city["id"]), label))
+    rows.sort()
+
+    ids = array("I", (city_id for _, city_id, _ in rows))
+    offsets = array("I", [0])
+    records = bytearray()
+    for key, _, label in rows:
+        records += key + b"\t" + label.encode("utf-8")
+        offsets.append(len(records))
+    if sys.byteorder != "little":
+        ids.byteswap()
+        offsets.byteswap()
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(rows), KEY_WIDTH))
+        for key, _, _ in rows:
+            f.write(key[:KEY_WIDTH].ljust(KEY_WIDTH, b"\0"))
+        f.write(ids.tobytes())
+        f.write(offsets.tobytes())
+        f.write(records)
+    os.replace(tmp, path)
+    return len(rows)
+
+
+def load_city_list(data: bytes) -> List[Dict]:
+    """Parse city.list.json, gzipped or not."""
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def build_file(data: bytes, path: str) -> int:
+    """
+    Write an index file from city.list.json contents.
+
+    Parsing and sorting ~200k cities holds the GIL for about a second,
+    so the app runs this in a worker process.
+
+    Args:
+        data: city.list.json, gzipped or not
+        path: Output file (replaced atomically)
+
+    Returns:
+        Number of cities written
+    """
+    return build(load_city_list(data), path)
+
+
+class _Keys:
+    """
+    The sorted key table as a sequence of bytes, for bisect.
+
+    Entries keep their NUL padding: it sorts below every other byte, so
+    padded keys compare like the names themselves.
+    """
+
+    __slots__ = ("_mm", "_start", "_width", "_count")
+
+    def __init__(self, mm: mmap.mmap, start: int, width: int, count: int):
+        self._mm = mm
+        self._start = start
+        self._width = width
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        start = self._start + i * self._width
+        return self._mm[start:start + self._width]
+
+
+class CityIndex:
+    """
+    Ranked prefix and fuzzy city search over a memory-mapped index file.
+
+    The file is opened on the first query; until then (or if it does not
+    exist yet) the index costs nothing. Prefix matches are a binary search
+    over the sorted key table and come out in key order, so an exact name
+    ranks first, then longer names. When a query has no prefix matches,
+    a bounded edit-distance walk over the same table (read as an
+    implicit trie) finds names the query is a typo of.
+
+    A prefix lookup takes tens of microseconds, so it can run on every
+    keystroke. The fuzzy walk takes up to about 2 ms; callers that
+    suggest while typing should skip it (fuzzy=False) and ask again
+    once typing pauses.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or Config.CITY_INDEX_PATH
+        self._mm: Optional[mmap.mmap] = None
+        self._keys: Optional[_Keys] = None
+        self._ids_start = 0
+        self._offsets_start = 0
+        self._records_start = 0
+
+    @property
+    def available(self) -> bool:
+        return self._mm is not None or os.path.exists(self.path)
+
+    def _open(self) -> bool:
+        """Map the index file; False if it is missing or unreadable."""
+        if self._mm is not None:
+            return True
+        try:
+            with open(self.path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        magic, count, width = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            mm.close()
+            print(f"DEBUG: {self.path} is not a city index")
+            return False
+        keys_start = _HEADER.size
+        self._ids_start = keys_start + count * width
+        self._offsets_start = self._ids_start + count * 4
+        self._records_start = self._offsets_start + (count + 1) * 4
+        self._keys = _Keys(mm, keys_start, width, count)
+        self._mm = mm
+        return True
+
+    def build_from(self, data: bytes) -> int:
+        """
+        (Re)build this index's file from city.list.json contents.
+
+        Args:
+            data: city.list.json, gzipped or not
+
+        Returns:
+            Number of cities indexed
+        """
+        self.close()  # the next query maps the new file
+        return build_file(data, self.path)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = None
+        self._keys = None
+
+    def _record(self, i: int) -> Tuple[bytes, str]:
+        start, end = struct.unpack_from("<II", self._mm, self._offsets_start + i * 4)
+        raw = self._mm[self._records_start + start:self._records_start + end]
+        key, _, label = raw.partition(b"\t")
+        return key, label.decode("utf-8")
+
+    def _city_id(self, i: int) -> int:
+        return struct.unpack_from("<I", self._mm, self._ids_start + i * 4)[0]
+
+    def _range(self, prefix: bytes, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        """Index range of keys starting with `prefix` (truncated to the key width)."""
+        keys = self._keys
+        prefix = prefix[:keys._width]
+        hi = len(keys) if hi is None else hi
+        lo = bisect.bisect_left(keys, prefix, lo, hi)
+        return lo, bisect.bisect_left(keys, prefix + b"\xff", lo, hi)
+
+    def suggest(
+        self,
+        query: str,
+        limit: int = Config.CITY_SUGGESTIONS,
+        fuzzy: bool = True,
+    ) -> List[Suggestion]:
+        """
+        Cities whose names start with `query`, or else close misspellings.
+
+        Text after a comma ("London, GB", as on a suggestion) ends the
+        name and narrows the matches to labels with those region or
+        country parts (the last one may be partial).
+
+        Args:
+            query: Text typed so far
+            limit: Maximum number of suggestions
+            fuzzy: Search for misspellings when no name starts with `query`
+
+        Returns:
+            Suggestions, best first (empty if the index is not available)
+        """
+        name, *qualifiers = [normalize(part) for part in query.split(",")]
+        key = name.encode("utf-8")
+        qualifiers = [q for q in qualifiers if q]
+        complete = "," in query
+        if not key or not self._open():
+            return []
+
+        results: List[Suggestion] = []
+        seen = set()
+        lo, hi = self._range(key)
+        for i in range(lo, hi):
+            full_key, label = self._record(i)
+            # Whole keys, as the table's may be truncated
+            matched = full_key == key if complete else full_key.startswith(key)
+            if matched and self._qualified(label, qualifiers):
+                results.append(Suggestion(self._city_id(i), label, 0))
+                seen.add(i)
+                if len(results) == limit:
+                    return results
+        if results or not fuzzy:
+            return results
+
+        # One typo first; two only for longer queries that still lack matches
+        budget = [Config.CITY_FUZZY_BUDGET]
+        for max_edits in (1, 2):
+            if len(key) < 3 * max_edits:
+                break
+            for distance, start, end in self._fuzzy(key[:FUZZY_WIDTH], max_edits, budget):
+                for i in range(start, end):
+                    if i not in seen:
+                        seen.add(i)
+                        label = self._record(i)[1]
+                        if not self._qualified(label, qualifiers):
+                            continue
+                        results.append(Suggestion(self._city_id(i), label, distance))
+                        if len(results) == limit:
+                            return results
+        return results
+
+    @staticmethod
+    def _qualified(label: str, qualifiers: List[str]) -> bool:
+        """Whether every typed region or country part starts one of the label's."""
+        if not qualifiers:
+            return True
+        parts = [normalize(part) for part in label.split(",")[1:]]
+        return all(any(part.startswith(q) for part in parts) for q in qualifiers)
+
+    def _fuzzy(
+        self,
+        query: bytes,
+        max_edits: int,
+        budget: List[int],
+        anchored: bool = True,
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Key ranges whose prefix is within `max_edits` of the query.
+
+        Walks the sorted table as a trie (each child is one bisect step),
+        carrying an edit-distance row (Levenshtein plus adjacent swaps), and
+        expands the most promising branch first. Branches already too far
+        off are pruned, the first byte must match if `anchored`, and the
+        walk stops when `budget` (a one-item list of nodes left, shared
+        between calls) runs out, which bounds the time per keystroke.
+
+        Returns:
+            (distance, start, end) ranges, closest first; among equally
+            close ones, ranges starting with a complete name come first
+        """
+        keys = self._keys
+        width = keys._width
+        found = []
+
+        start_row = list(range(len(query) + 1))
+        if anchored:
+            lo, hi = self._range(query[:1])
+            first = self._step(start_row, None, None, query, query[0])
+            heap = [(min(first), 0, 1, lo, hi, first, start_row, query[0])]
+        else:
+            heap = [(0, 0, 0, 0, len(keys), start_row, None, None)]
+        order = itertools.count(1)
+
+        while heap and budget[0] > 0:
+            _, _, depth, lo, hi, row, prev_row, prev_byte = heapq.heappop(heap)
+            if row[-1] <= max_edits:
+                complete = depth >= width or keys[lo][depth] == 0
+                found.append((row[-1], not complete, lo, hi))
+                continue
+            if depth >= width:
+                continue
+
+            i = lo
+            while i < hi and budget[0] > 0:
+                budget[0] -= 1
+                key = keys[i]
+                byte = key[depth]
+                if byte == 0:  # names ending here
+                    i = bisect.bisect_right(keys, key, i, hi)
+                    continue
+                end = bisect.bisect_left(keys, key[:depth] + bytes([byte + 1]), i, hi)
+                child_row = self._step(row, prev_row, prev_byte, query, byte)
+                best = min(child_row)
+                if best <= max_edits:
+                    heapq.heappush(heap, (best, next(order), depth + 1, i, end, child_row, row, byte))
+                i = end
+
+        found.sort()
+        return [(distance, lo, hi) for distance, _, lo, hi in found]
+
+    @staticmethod
+    def _step(
+        row: List[int],
+        prev_row: Optional[List[int]],
+        prev_byte: Optional[int],
+        query: bytes,
+        byte: int,
+    ) -> List[int]:
+        """Next edit-distance row after appending `byte` to the candidate."""
+        left = row[0] + 1
+        new = [left]
+        swap = prev_row is not None and prev_byte != byte
+        for j in range(1, len(query) + 1):
+            cost = row[j - 1] + (query[j - 1] != byte)
+            if row[j] < cost:
+                cost = row[j] + 1
+            if left < cost:
+                cost = left + 1
+            if swap and j > 1 and query[j - 1] == prev_byte and query[j - 2] == byte and prev_row[j - 2] < cost:
+                cost = prev_row[j - 2] + 1  # swapped letters
+            new.append(cost)
+            left = cost
+        return new
+
+    def _distance(self, query: bytes, name: bytes) -> int:
+        """Edit distance between two whole keys (Levenshtein plus adjacent swaps)."""
+        row, prev_row, prev_byte = list(range(len(query) + 1)), None, None
+        for byte in name:
+            row, prev_row, prev_byte = self._step(row, prev_row, prev_byte, query, byte), row, byte
+        return row[-1]
+
+    def resolve(self, text: str) -> Optional[Union[int, str]]:
+        """
+        What to look up for a searched name, so typos do not cost a failed request.
+
+        A name is only corrected when it is certain: no indexed name starts
+        with it, and exactly one indexed name is a single edit away from
+        it as a whole, with the search over the index complete.
+
+        Args:
+            text: A suggestion label ("London, GB") or a bare city name
+
+        Returns:
+            The OWM city ID when the index identifies one city; the name
+            unchanged when it matches several cities (OWM picks, as before);
+            the corrected name for a single-edit misspelling of a
+            non-unique name; None when the index cannot help
+        """
+        parts = [normalize(part) for part in text.split(",")]
+        key = parts[0].encode("utf-8")
+        if not key or not self._open():
+            return None
+
+        exact = []
+        lo, hi = self._range(key)
+        for i in range(lo, hi):
+            full_key, label = self._record(i)
+            if full_key == key:
+                exact.append((i, label))
+
+        if len(parts) > 1:
+            for i, label in exact:
+                if [normalize(part) for part in label.split(",")] == parts:
+                    return self._city_id(i)
+            return None
+        if exact:
+            return self._city_id(exact[0][0]) if len(exact) == 1 else text.strip()
+
+        # The start of longer names (typed in full or picked from the
+        # suggestions) is not a typo
+        if any(self._record(i)[0].startswith(key) for i in range(lo, hi)):
+            return None
+        if len(key) < 3 or len(key) >= KEY_WIDTH:
+            return None
+
+        # Every whole name one edit away; the first letter may be the typo
+        budget = [Config.CITY_RESOLVE_BUDGET]
+        matches = []
+        for _, start, end in self._fuzzy(key, 1, budget, anchored=False):
+            for i in range(start, end):
+                budget[0] -= 1
+                full_key, label = self._record(i)
+                if abs(len(full_key) - len(key)) <= 1 and self._distance(key, full_key) == 1:
+                    matches.append((full_key, i, label))
+        if budget[0] <= 0:
+            return None  # search cut short: other names may be as close
+
+        names = {full_key for full_key, _, _ in matches}
+        if len(names) != 1:
+            return None
+        if len(matches) == 1:
+            return self._city_id(matches[0][1])
+        return matches[0][2].split(",")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?", help="local city.list.json(.gz); downloaded when omitted")
+    parser.add_argument("--output", help="index file to write (default: Config.CITY_INDEX_PATH)")
+    args = parser.parse_args()
+
+    if args.source:
+        with open(args.source, "rb") as f:
+            data = f.read()
+    else:
+        import httpx
+        print(f"Downloading {Config.CITY_LIST_URL} ...")
+        response = httpx.get(Config.CITY_LIST_URL, timeout=60, follow_redirects=True)
+        response.raise_for_status()
+        data = response.content
+
+    index = CityIndex(args.output)
+    count = index.build_from(data)
+    print(f"Wrote {count} cities to {index.path} ({os.path.getsize(index.path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
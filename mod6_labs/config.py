@@ -2,10 +2,28 @@
 """Configuration management for the Weather App."""
 
 import os
-from dotenv import load_dotenv
+
+
+def load_env():
+    """Load environment variables from the nearest .env file, if there is one.
+    
+    Searches this directory and its parents (as python-dotenv's
+    load_dotenv() does); dotenv itself is only imported when a file exists.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
 
 # Load environment variables from .env file
-load_dotenv()
+load_env()
 
 class Config:
     """Application configuration."""
@@ -27,7 +45,87 @@ class Config:
     
     # API Settings
     UNITS = "metric"  # metric, imperial, or standard
-    TIMEOUT = 10  # seconds
+    TIMEOUT = 10  # seconds per request, retries included
+    CONNECT_TIMEOUT = 3  # seconds to establish a connection
+    
+    # Rate Limiting (OWM free tier allows 60 calls/minute)
+    RATE_LIMIT_PER_MINUTE = int(os.getenv("OWM_CALLS_PER_MINUTE", "60"))
+    RATE_LIMIT_BURST = 10  # calls that may be sent back-to-back
+    
+    # Retries and Circuit Breaker
+    RETRY_ATTEMPTS = 3  # total tries for network errors, 5xx and 429 (within TIMEOUT)
+    RETRY_BASE_DELAY = 0.5  # seconds, doubled per retry (with jitter)
+    RETRY_MAX_DELAY = 4  # seconds
+    BREAKER_FAILURE_THRESHOLD = 3  # consecutive failed requests before failing fast
+    BREAKER_RESET_TIMEOUT = 30  # seconds before a half-open probe is allowed
+    
+    # AI Settings
+    AI_TIMEOUT = 8  # seconds before falling back to default lifestyle content
+    AI_FALLBACK_DEADLINE = 2.5  # seconds before default lifestyle content is shown
+    AI_UPGRADE_WINDOW = 6  # further seconds a late AI result may still replace it
+    AI_STREAMING = True  # fill lifestyle cards field by field as Gemini streams
+    AI_BATCH_SIZE = 8  # situations per batched Gemini request
+    AI_BATCH_TIMEOUT = 20  # seconds; batched responses are longer
+    AI_MAX_WORKERS = 2  # threads for Gemini calls if the SDK has no async API
+    AI_CACHE_TTL = 6 * 60 * 60  # seconds AI content is reused for the same conditions
+    AI_CACHE_MAX_ENTRIES = 200
+    AI_CACHE_TEMP_BUCKET = 5  # degrees C per cache bucket
+    AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")  # JSON file; unset keeps the cache in memory
+    
+    # IP Geolocation
+    IPAPI_URL = "https://ipapi.co/json/"
+    IPAPI_TIMEOUT = 3  # seconds; startup shows the last known location meanwhile
+    
+    # HTTP Connection Pool
+    HTTP2 = os.getenv("WEATHER_HTTP2", "false").lower() == "true"  # needs 'h2' installed
+    MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "10"))
+    MAX_KEEPALIVE_CONNECTIONS = 5
+    KEEPALIVE_EXPIRY = 30  # seconds an idle connection is kept open
+    
+    # Weather Cache
+    CACHE_PATH = os.getenv(
+        "WEATHER_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "weather_cache.db")
+    )
+    CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "50"))
+    CACHE_STALE_MINUTES = 60  # stale data older than this is refetched before display
+    GEOHASH_PRECISION = 5  # ~4.9 km cells for the coordinate index
+    GEO_MATCH_RADIUS_KM = 5  # coordinate lookups within this distance share an entry
+    
+    # Weather Icons
+    ICON_URL = "https://openweathermap.org/img/wn/{name}"  # name: "10d.png", "10d@2x.png"
+    ASSETS_DIR = os.getenv(
+        "WEATHER_ASSETS_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+    )
+    ICON_PREFETCH_TIMEOUT = 1.0  # seconds a render waits for missing icons
+    
+    # City Search Suggestions
+    CITY_LIST_URL = "https://bulk.openweathermap.org/sample/city.list.json.gz"
+    CITY_INDEX_PATH = os.getenv(
+        "CITY_INDEX_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "city_index.bin")
+    )
+    CITY_SUGGESTIONS = 8  # suggestions shown while typing
+    CITY_FUZZY_BUDGET = 200  # trie nodes a misspelling search may visit
+    CITY_FUZZY_DELAY = 0.15  # seconds of typing pause before misspellings are searched
+    CITY_RESOLVE_BUDGET = 5000  # trie nodes and names checked to correct a searched name
+    
+    # Weather Alerts
+    ALERT_MAX = 3  # alerts shown in the banner
+    
+    # Debugging and Tracing
+    DEBUG = os.getenv("WEATHER_DEBUG", "false").lower() == "true"  # per-search trace waterfalls
+    TRACE_PATH = os.getenv("WEATHER_TRACE_PATH")  # JSON Lines file of completed search traces
+    TRACE_KEEP = 20  # completed traces kept in memory
+    
+    # Bulk Fetching
+    GROUP_URL = "https://api.openweathermap.org/data/2.5/group"
+    GROUP_MAX_IDS = 20  # OWM limit for one group request
+    BULK_CONCURRENCY = int(os.getenv("WEATHER_BULK_CONCURRENCY", "8"))
+    
+    # Request Coalescing
+    COORD_PRECISION = 2  # decimal places (~1 km) when matching coordinate lookups
     
     @classmethod
     def validate(cls):
@@ -41,6 +139,3 @@ class Config:
         if not cls.GEMINI_API_KEY:
             print("WARNING: GEMINI_API_KEY not found. AI features will be disabled.")
         return True
-
-# Validate configuration on import
-Config.validate()
\ No newline at end of file
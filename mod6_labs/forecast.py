@@ -0,0 +1,198 @@
+# forecast.py
+"""Compact forecast model, parsed once per fetch, and its aggregations."""
+
+import datetime
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+
+class Aggregation:
+    """
+    Forecast samples grouped into consecutive time buckets (columns).
+
+    Bucket boundaries follow the city's local clock, so a daily bucket
+    is a local calendar day, or the sample grid (see Forecast.aggregate),
+    so an hourly slot starts at a forecast time.
+
+    Attributes:
+        starts: Bucket start times (UTC epoch seconds)
+        labels: Local-time labels ("Mon", "15:00")
+        counts: Samples per bucket
+        temp_min, temp_max, temp_mean: Temperatures (°C)
+        precip: Total rain + snow (mm)
+        conditions: Most frequent condition group
+        icons: OWM icon code for that condition
+    """
+
+    __slots__ = (
+        "starts", "labels", "counts", "temp_min", "temp_max", "temp_mean",
+        "precip", "conditions", "icons",
+    )
+
+    def __init__(self):
+        self.starts = array("q")
+        self.labels: List[str] = []
+        self.counts = array("i")
+        self.temp_min = array("d")
+        self.temp_max = array("d")
+        self.temp_mean = array("d")
+        self.precip = array("d")
+        self.conditions: List[str] = []
+        self.icons: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class Forecast:
+    """
+    Column-oriented copy of an OpenWeatherMap 5-day / 3-hour forecast.
+
+    Built once when a forecast arrives; rendering and unit conversion
+    only read and format these columns (or the daily / hourly
+    aggregations, computed once per view), so no JSON walking, string
+    matching or date parsing happens on re-render. Temperatures are in
+    °C, as fetched with units=metric. Samples are in time order, as OWM
+    returns them.
+
+    Attributes:
+        timezone: City offset from UTC in seconds
+        times: Sample times (UTC epoch seconds)
+        temps: Temperatures (°C)
+        icons: OWM icon codes ("10d")
+        conditions: Condition groups ("Rain")
+        precip: Rain + snow volume over the 3 hours (mm)
+        wind: Wind speeds (m/s)
+    """
+
+    __slots__ = (
+        "timezone", "times", "temps", "icons", "conditions", "precip", "wind", "_views",
+    )
+
+    def __init__(
+        self,
+        timezone: int,
+        times: array,
+        temps: array,
+        icons: List[str],
+        conditions: List[str],
+        precip: array,
+        wind: array,
+    ):
+        self.timezone = timezone
+        self.times = times
+        self.temps = temps
+        self.icons = icons
+        self.conditions = conditions
+        self.precip = precip
+        self.wind = wind
+        self._views: Dict[tuple, Aggregation] = {}
+
+    @classmethod
+    def from_payload(cls, data: Dict) -> "Forecast":
+        """
+        Parse a /forecast response.
+
+        Args:
+            data: Forecast payload as returned by WeatherService.get_forecast
+
+        Returns:
+            Forecast with one column entry per 3-hour sample
+        """
+        entries = data.get("list", [])
+        weather = [(e.get("weather") or [{}])[0] for e in entries]
+        return cls(
+            timezone=data.get("city", {}).get("timezone", 0),
+            times=array("q", (e["dt"] for e in entries)),
+            temps=array("d", (e.get("main", {}).get("temp", 0.0) for e in entries)),
+            icons=[w.get("icon", "01d") for w in weather],
+            conditions=[w.get("main", "") for w in weather],
+            precip=array("d", (
+                e.get("rain", {}).get("3h", 0.0) + e.get("snow", {}).get("3h", 0.0)
+                for e in entries
+            )),
+            wind=array("d", (e.get("wind", {}).get("speed", 0.0) for e in entries)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def aggregate(
+        self,
+        bucket_seconds: int,
+        label_format: str,
+        limit: Optional[int] = None,
+        day_icons: bool = False,
+        on_samples: bool = False,
+    ) -> Aggregation:
+        """
+        Group samples into local-time buckets.
+
+        Each sample's bucket is computed in one pass over the time column,
+        runs of equal buckets are found from the key changes, and each
+        statistic is one built-in reduction over a column slice, so the
+        cost per sample is constant whatever the bucket size.
+
+        Args:
+            bucket_seconds: Bucket length (SECONDS_PER_DAY for a daily view)
+            label_format: strftime format for the bucket's local start time
+            limit: Maximum number of buckets (from the first sample on)
+            day_icons: Use the daytime variant of icons (for daily views)
+            on_samples: Start buckets at the first sample instead of on the
+                local clock, so each starts (and is labelled) at a
+                forecast time; OWM's 3-hour grid is not aligned to local
+                3-hour slots in most time zones
+
+        Returns:
+            Aggregation with one entry per bucket
+        """
+        result = Aggregation()
+        n = len(self.times)
+        if not n:
+            return result
+
+        tz = self.timezone
+        origin = (self.times[0] + tz) % bucket_seconds if on_samples else 0
+        keys = [(t + tz - origin) // bucket_seconds for t in self.times]
+        bounds = [0] + [i for i in range(1, n) if keys[i] != keys[i - 1]] + [n]
+        runs = list(zip(bounds, bounds[1:]))[:limit]
+
+        for start, end in runs:
+            temps = self.temps[start:end]
+            conditions = self.conditions[start:end]
+            condition = Counter(conditions).most_common(1)[0][0]
+            icon = self.icons[start + conditions.index(condition)]
+            if day_icons:
+                icon = icon[:-1] + "d"
+
+            local_start = keys[start] * bucket_seconds + origin
+            result.starts.append(local_start - tz)
+            result.labels.append(
+                datetime.datetime.utcfromtimestamp(local_start).strftime(label_format)
+            )
+            result.counts.append(end - start)
+            result.temp_min.append(min(temps))
+            result.temp_max.append(max(temps))
+            result.temp_mean.append(sum(temps) / len(temps))
+            result.precip.append(sum(self.precip[start:end]))
+            result.conditions.append(condition)
+            result.icons.append(icon)
+        return result
+
+    def daily(self, days: int = 5) -> Aggregation:
+        """Per local calendar day, starting today (computed once)."""
+        key = ("daily", days)
+        if key not in self._views:
+            self._views[key] = self.aggregate(SECONDS_PER_DAY, "%a", days, day_icons=True)
+        return self._views[key]
+
+    def hourly(self, hours: int = 1, count: int = 8) -> Aggregation:
+        """Per `hours`-hour slot from the first sample, starting now (computed once)."""
+        key = ("hourly", hours, count)
+        if key not in self._views:
+            self._views[key] = self.aggregate(hours * SECONDS_PER_HOUR, "%H:%M", count, on_samples=True)
+        return self._views[key]
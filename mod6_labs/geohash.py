@@ -0,0 +1,78 @@
+# geohash.py
+"""Minimal geohash encoding for quantizing coordinates into cache cells."""
+
+import math
+from typing import List, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(lat: float, lon: float, precision: int = 5) -> str:
+    """
+    Encode a coordinate pair as a geohash string.
+
+    Args:
+        lat: Latitude in degrees
+        lon: Longitude in degrees
+        precision: Number of characters (5 ~ 4.9 km cells, 6 ~ 1.2 km)
+
+    Returns:
+        Geohash of the cell containing the point
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Height and width of a cell in degrees (lat, lon)."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def neighborhood(lat: float, lon: float, precision: int = 5) -> List[str]:
+    """The cell containing the point followed by its 8 neighbours."""
+    height, width = cell_size(precision)
+    cells = [encode(lat, lon, precision)]
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            if d_lat == 0 and d_lon == 0:
+                continue
+            n_lat = max(-90.0, min(90.0, lat + d_lat * height))
+            n_lon = (lon + d_lon * width + 180.0) % 360.0 - 180.0
+            cell = encode(n_lat, n_lon, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points (haversine)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    d_lat = p2 - p1
+    d_lon = math.radians(lon2 - lon1)
+    a = math.sin(d_lat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(d_lon / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
@@ -0,0 +1,123 @@
+# icon_store.py
+"""Local store of OpenWeatherMap weather icons, served as Flet assets."""
+
+import asyncio
+import os
+from typing import Iterable, Optional, Set
+from config import Config
+
+# Every icon OWM uses: condition code x day/night variant
+ICON_CODES = tuple(
+    f"{code}{variant}"
+    for code in ("01", "02", "03", "04", "09", "10", "11", "13", "50")
+    for variant in ("d", "n")
+)
+ICON_SCALES = ("", "@2x")  # 50px and 100px versions
+
+
+class IconStore:
+    """
+    Weather icons downloaded once to the assets directory.
+
+    Icons live in `<ASSETS_DIR>/icons/` and are referenced as local asset
+    paths, so re-rendering never downloads them again and cached weather
+    shows its icons offline. An icon that is not on disk yet is referenced
+    by its remote URL until it has been fetched.
+    """
+
+    def __init__(self, weather_service, assets_dir: Optional[str] = None):
+        """
+        Args:
+            weather_service: WeatherService whose shared HTTP client is used
+            assets_dir: Directory passed to ft.app(assets_dir=...)
+                (defaults to Config.ASSETS_DIR)
+        """
+        self.weather_service = weather_service
+        self.directory = os.path.join(assets_dir or Config.ASSETS_DIR, "icons")
+        try:
+            self._local: Set[str] = set(os.listdir(self.directory))
+        except OSError:
+            self._local = set()
+        self._pending = {}  # file name -> download task
+
+    @staticmethod
+    def _file_name(code: str, scale: str) -> str:
+        return f"{code}{scale}.png"
+
+    def src(self, code: str, scale: str = "") -> str:
+        """
+        Image source for an icon.
+
+        Args:
+            code: OWM icon code ("10d")
+            scale: "" or "@2x"
+
+        Returns:
+            Asset path if the icon is stored locally, otherwise its OWM URL
+        """
+        name = self._file_name(code, scale)
+        if name in self._local:
+            return f"/icons/{name}"
+        return Config.ICON_URL.format(name=name)
+
+    async def prefetch(
+        self,
+        codes: Iterable[str],
+        scales: Iterable[str] = ICON_SCALES,
+        timeout: Optional[float] = Config.ICON_PREFETCH_TIMEOUT,
+    ) -> bool:
+        """
+        Make sure the given icons are stored locally.
+
+        Returns at once when they already are. Downloads that take longer
+        than `timeout` keep running in the background; until they finish,
+        src() keeps returning the remote URL for those icons.
+
+        Args:
+            codes: OWM icon codes
+            scales: Sizes to fetch for each code
+            timeout: Seconds to wait (None waits for every download)
+
+        Returns:
+            True if all the icons are local by the time this returns
+        """
+        names = {
+            self._file_name(code, scale)
+            for code in codes if code in ICON_CODES
+            for scale in scales
+        } - self._local
+        if not names:
+            return True
+
+        tasks = []
+        for name in names:
+            task = self._pending.get(name)
+            if task is None:
+                task = self._pending[name] = asyncio.create_task(self._download(name))
+            tasks.append(task)
+
+        done, _ = await asyncio.wait(tasks, timeout=timeout)
+        return len(done) == len(tasks) and names <= self._local
+
+    async def prefetch_all(self) -> bool:
+        """Fetch every icon not yet stored (run once in the background)."""
+        return await self.prefetch(ICON_CODES, timeout=None)
+
+    async def _download(self, name: str):
+        """Fetch one icon and write it to disk; failures are logged and retried on the next prefetch."""
+        try:
+            client = await self.weather_service.start()
+            response = await client.get(Config.ICON_URL.format(name=name))
+            response.raise_for_status()
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, name)
+            # Write to a temporary file first so a partial icon is never served
+            with open(path + ".tmp", "wb") as f:
+                f.write(response.content)
+            os.replace(path + ".tmp", path)
+            self._local.add(name)
+        except Exception as e:
+            print(f"DEBUG: Icon {name} not fetched: {str(e)}")
+        finally:
+            self._pending.pop(name, None)
@@ -1,44 +1,128 @@
 """Weather Application using Flet v0.28.3"""
 
-import flet as ft
-import datetime
-import asyncio
-import httpx
-from weather_service import WeatherService
-from ai_service import AIService
-from config import Config
+import startup  # keep first: starts the cold-start clock
+
+with startup.timed("flet"):
+    import flet as ft
+with startup.timed("stdlib"):
+    import datetime
+    import asyncio
+    import concurrent.futures
+with startup.timed("config"):
+    from config import Config
+# One block per module, dependencies first, so each time is the module's own
+with startup.timed("metrics"):
+    from metrics import registry
+with startup.timed("tracing"):
+    from tracing import tracer
+with startup.timed("rate_limiter"):
+    from rate_limiter import BACKGROUND
+with startup.timed("weather_service"):
+    from weather_service import CityRef, WeatherService
+with startup.timed("forecast"):
+    from forecast import Forecast
+with startup.timed("alerts"):
+    from alerts import AlertEngine
+with startup.timed("icon_store"):
+    from icon_store import IconStore
+with startup.timed("city_index"):
+    from city_index import CityIndex, Suggestion, build_file
+with startup.timed("weather_cache"):
+    from weather_cache import WeatherCache
+with startup.timed("ai_service"):
+    from ai_service import AIService
+
+
+# Banner colors and icon per alert rule: (background, icon, icon color)
+ALERT_STYLES = {
+    "extreme_heat": (ft.Colors.RED_100, ft.Icons.LOCAL_FIRE_DEPARTMENT, ft.Colors.RED),
+    "high_temp": (ft.Colors.AMBER_100, ft.Icons.WARNING, ft.Colors.AMBER),
+    "freeze": (ft.Colors.BLUE_100, ft.Icons.AC_UNIT, ft.Colors.BLUE),
+    "high_wind": (ft.Colors.GREY_300, ft.Icons.AIR, ft.Colors.GREY_700),
+    "rain": (ft.Colors.BLUE_GREY_100, ft.Icons.UMBRELLA, ft.Colors.BLUE_GREY_700),
+}
+DEFAULT_ALERT_STYLE = (ft.Colors.AMBER_100, ft.Icons.WARNING, ft.Colors.AMBER)
 
 
 class WeatherApp:
     """Main Weather Application class."""
     
-    def __init__(self, page: ft.Page):
+    def __init__(self, page: ft.Page, weather_service: WeatherService = None):
         self.page = page
-        self.weather_service = WeatherService()
+        self.weather_service = weather_service or WeatherService()
         self.ai_service = AIService()
+        self.icon_store = IconStore(self.weather_service)
+        self.city_index = CityIndex()  # memory-mapped on the first keystroke
         self.page.scroll = "auto"
         self.setup_page()
+        tracer.instrument(self.page)  # page.update() spans for search traces
         
         # Initialize history
         self.search_history = []
         self.current_alert = None 
+        self.alert_banner = None  # one Banner, reused (closed banners stay in page.overlay)
+        self.alert_key = None  # (city, alert rules) on the banner
+        self.dismissed_alert = None  # alert_key of the banner the user dismissed
+        self.alert_engine = AlertEngine()
         
-        # --- Restore Cache Initialization ---
-        self.weather_cache = {} 
+        # --- Persistent Cache (warmed from disk) ---
+        self.weather_cache = WeatherCache()
         # Duration for which weather data is cached (in minutes)
         self.CACHE_DURATION = datetime.timedelta(minutes=10)
+        # Stale entries younger than this are shown at once and refreshed in the background
+        self.CACHE_STALE_DURATION = datetime.timedelta(minutes=Config.CACHE_STALE_MINUTES)
+        self.displayed_key = None
+        self.revalidating = set()
+        self.ai_task = None  # in-flight Gemini request for the city being rendered
+        self.lifestyle_task = None
+        self.render_id = 0  # bumped on every display; stale AI results are dropped
+        self.display_id = 0  # bumped when a display starts; superseded ones stop
+        self.forecast_lifestyle = {}  # forecast day start -> AI content for that day
+        self.forecast_view = "daily"  # or "hourly"
+        self.warm_task = None
+        self.search_change_id = 0  # bumped on every keystroke in the search bar
+        self.lifestyle_key = None  # AI cache key of the request filling the lifestyle cards
         
         # --- STATE TRACKING ---
         self.current_unit = "metric" # Default to metric
         self.current_temp = 0
         self.current_feels_like = 0
         self.forecast_data = None 
+        self.forecast = None  # Forecast model of forecast_data
         self.build_ui()
         self.page.update()
+        startup.first_paint()
+        
+        # --- HTTP CLIENT LIFECYCLE ---
+        # Open the pooled client now and close it when the page goes away.
+        # A disconnect may be temporary (web mode), so it keeps the cache open.
+        self.page.on_close = self.on_page_close
+        self.page.on_disconnect = self.on_page_disconnect
+        self.page.run_task(self.weather_service.start)
+        
+        # Download any weather icons not yet stored locally
+        self.page.run_task(self.icon_store.prefetch_all)
+        
+        # Build the city suggestion index on first run
+        if not self.city_index.available:
+            self.page.run_task(self.build_city_index)
+        
+        # Load the Gemini SDK in the background now that the window is up
+        self.page.run_task(self.ai_service.warm_up)
         
         # --- AUTO-FETCH LOCATION ON START ---
-        self.page.run_task(self.get_current_location_weather)
-        self.page.run_task(self.get_current_location_weather)
+        self.page.run_task(self.load_startup_weather)
+
+    async def on_page_close(self, e):
+        """Release network and cache resources when the page is closed."""
+        print(f"DEBUG: AI metrics: {self.ai_service.stats()}")
+        await self.weather_service.close()
+        self.weather_cache.close()
+
+    async def on_page_disconnect(self, e):
+        """Drop idle connections and save cache state; the page may reconnect."""
+        await self.weather_service.close()  # reopened on the next request
+        self.weather_cache.flush()
 
     def add_to_history(self, city: str):
         """Add city to search history and update UI."""
@@ -49,26 +133,92 @@ class WeatherApp:
         
         self.search_history.insert(0, city)
         self.search_history = self.search_history[:5]
-        
+        self.show_search_tiles()
+
+    def show_search_tiles(self, suggestions=None):
+        """Fill the search view with city suggestions, or the history if there are none."""
         # Determine text color based on current theme
         is_dark = self.page.theme_mode == ft.ThemeMode.DARK
         text_color = ft.Colors.WHITE if is_dark else ft.Colors.BLACK
         icon_color = ft.Colors.GREY_400 if is_dark else ft.Colors.GREY
 
-        self.search_bar.controls = [
-            ft.ListTile(
-                title=ft.Text(c, color=text_color),
-                leading=ft.Icon(ft.Icons.HISTORY, color=icon_color),
-                on_click=lambda e, city=c: self.search_from_history(city)
-            ) for c in self.search_history
-        ]
+        if suggestions:
+            self.search_bar.controls = [
+                ft.ListTile(
+                    title=ft.Text(s.label, color=text_color),
+                    leading=ft.Icon(ft.Icons.LOCATION_CITY, color=icon_color),
+                    on_click=lambda e, s=s: self.search_from_suggestion(s)
+                ) for s in suggestions
+            ]
+        else:
+            self.search_bar.controls = [
+                ft.ListTile(
+                    title=ft.Text(c, color=text_color),
+                    leading=ft.Icon(ft.Icons.HISTORY, color=icon_color),
+                    on_click=lambda e, city=c: self.search_from_history(city)
+                ) for c in self.search_history
+            ]
         
-        item_count = len(self.search_history)
+        item_count = len(self.search_bar.controls)
         view_height = min(350, max(70, item_count * 65))
         
         self.search_bar.view_size_constraints = ft.BoxConstraints(max_height=view_height)
         self.search_bar.update()
 
+    async def on_search_change(self, e):
+        """Suggest cities from the offline index as the user types.
+        
+        Async so it runs on the event loop, like build_city_index, which
+        closes the index map while swapping in a new file.
+        """
+        text = (e.data or "").strip()
+        self.search_change_id += 1
+        if len(text) < 2:
+            self.show_search_tiles()
+            return
+        
+        # Prefix matches are instant; misspellings are searched once typing pauses
+        suggestions = self.city_index.suggest(text, fuzzy=False)
+        self.show_search_tiles(suggestions)
+        if not suggestions:
+            asyncio.ensure_future(self.suggest_misspellings(self.search_change_id, text))
+
+    async def suggest_misspellings(self, change_id, text):
+        """Suggest cities `text` may be a typo of, unless the user typed on."""
+        await asyncio.sleep(Config.CITY_FUZZY_DELAY)
+        if change_id == self.search_change_id:
+            self.show_search_tiles(self.city_index.suggest(text))
+
+    def search_from_suggestion(self, suggestion: Suggestion):
+        """Handle click on a suggested city: look it up by its OWM ID."""
+        self.search_bar.close_view(suggestion.label)
+        self.search_bar.value = suggestion.label
+        if self.current_alert:
+            self.close_banner()
+        with tracer.trace("on_search", query=suggestion.label):
+            self.page.run_task(self.get_weather, suggestion.city_id)
+
+    async def build_city_index(self):
+        """Download the OWM city list and build the suggestion index (first run only)."""
+        try:
+            client = await self.weather_service.start()
+            response = await client.get(Config.CITY_LIST_URL, timeout=60, follow_redirects=True)
+            response.raise_for_status()
+            
+            # In a separate process: parsing and sorting hold the GIL, and
+            # in a thread would stall the event loop during startup
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+            try:
+                count = await asyncio.get_running_loop().run_in_executor(
+                    pool, build_file, response.content, self.city_index.path
+                )
+            finally:
+                pool.shutdown(wait=False)
+            self.city_index.close()  # the next query maps the new file
+            print(f"DEBUG: City index built ({count} cities)")
+        except Exception as e:
+            print(f"DEBUG: City index not built: {str(e)}")
+
     def search_from_history(self, city):
         """Handle click on history item."""
         self.search_bar.close_view(city)
@@ -126,21 +276,13 @@ class WeatherApp:
         self.search_bar.text_style = ft.TextStyle(color=input_color)
         self.search_bar.view_bgcolor = input_bg
         self.search_bar.bar_border_side = ft.BorderSide(1, sub_text_color)
-        self.search_bar.bar_leading = ft.Icon(ft.Icons.LOCATION_CITY, color=ft.Colors.PRIMARY)
-        # Update history list tile colors if they exist
-        if self.search_history:
-             self.search_bar.controls = [
-                ft.ListTile(
-                    title=ft.Text(c, color=text_color),
-                    leading=ft.Icon(ft.Icons.HISTORY, color=sub_text_color),
-                    on_click=lambda e, city=c: self.search_from_history(city)
-                ) for c in self.search_history
-            ]
+        # Recolor history list tiles in place
+        for tile in self.search_bar.controls:
+            tile.title.color = text_color
+            tile.leading.color = sub_text_color
 
-        # Update display
-        if hasattr(self, 'temperature'):
-            self.update_display() 
-            
+        # Update display, then send every change in one batch
+        self.update_display()
         self.page.update()
 
     def toggle_units(self, e):
@@ -155,17 +297,21 @@ class WeatherApp:
             self.current_feels_like = (self.current_feels_like - 32) * 5/9
             
         self.update_display()
-        self.update_forecast_display()
+        self.page.update()
 
     def update_display(self):
-        """Update temperature displays on the UI."""
+        """Update temperature displays on the UI.
+        
+        Only properties of the existing controls are changed (Flet sends
+        just the ones that differ); nothing is rebuilt and nothing is sent
+        until the caller's single page.update().
+        """
         if not hasattr(self, 'temperature'):
             return
 
         unit_sym = "°C" if self.current_unit == "metric" else "°F"
         
         self.unit_button.text = unit_sym
-        self.unit_button.update()
         
         self.temperature.value = f"{self.current_temp:.1f}{unit_sym}"
         self.feelslike.value = f"Feels like {self.current_feels_like:.1f}{unit_sym}"
@@ -195,110 +341,98 @@ class WeatherApp:
         self.solar_title.color = primary_col
         self.forecast_title.color = primary_col
         
-        # REBUILD CARDS TO UPDATE COLORS
-        
-        # 1. Additional Info
-        if hasattr(self, 'last_weather_data'):
-             humidity = self.last_weather_data.get("main", {}).get("humidity", 0)
-             wind_speed = self.last_weather_data.get("wind", {}).get("speed", 0)
-             pressure = self.last_weather_data.get("main", {}).get("pressure", 0)
-             wind_gust = self.last_weather_data.get("wind", {}).get("gust", 0)
-             
-             self.additional_info_row.controls = [
-                self.create_info_card(ft.Icons.WATER_DROP, "Humidity", f'{humidity}%', card_bg, primary_col, secondary_col),
-                self.create_info_card(ft.Icons.AIR, "Wind Speed", f'{wind_speed} m/s', card_bg, primary_col, secondary_col),
-                self.create_info_card(ft.Icons.WIND_POWER, "Gustiness", f'{wind_gust} m/s', card_bg, primary_col, secondary_col),
-                self.create_info_card(ft.Icons.GAS_METER, "Pressure", f'{pressure} hPa', card_bg, primary_col, secondary_col),
-            ]
-             self.additional_info_row.update()
-
-        # 2. Solar Events
-        if hasattr(self, 'last_weather_data'):
-             timezone_offset = self.last_weather_data.get("timezone", 0)
-             sunrise = datetime.datetime.utcfromtimestamp(self.last_weather_data.get("sys", {}).get("sunrise", 0) + timezone_offset).strftime("%I:%M %p")
-             sunset = datetime.datetime.utcfromtimestamp(self.last_weather_data.get("sys", {}).get("sunset", 0) + timezone_offset).strftime("%I:%M %p")
-             
-             self.solar_row.controls = [
-                self.create_info_card(ft.Icons.SUNNY, "Sunrise", f'{sunrise}', card_bg, primary_col, secondary_col),
-                self.create_info_card(ft.Icons.SUNNY, "Sunset", f'{sunset}', card_bg, primary_col, secondary_col)
-            ]
-             self.solar_row.update()
-
-        # 3. Lifestyle Cards (If data exists)
-        if hasattr(self, 'last_lifestyle_data'):
-             ls = self.last_lifestyle_data
-             # Update Trivia
-             self.trivia_card.content.controls[0].controls[0].color = primary_col # Icon
-             self.trivia_card.content.controls[0].controls[1].color = primary_col # Title
-             self.trivia_card.content.controls[1].color = secondary_col # Text
-             self.trivia_card.update()
-             
-             # Update Music
-             self.music_card.content.controls[0].controls[0].color = primary_col 
-             self.music_card.content.controls[0].controls[1].color = primary_col
-             self.music_card.content.controls[1].color = secondary_col
-             self.music_card.content.controls[2].color = secondary_col
-             self.music_card.update()
-
-        self.temperature.update()
-        self.feelslike.update()
-        self.description.update()
-        self.location_text.update()
-        self.solar_title.update()
-        self.forecast_title.update()
-        
-        # Re-run forecast update for colors
+        # 1. Additional Info and Solar Events
+        for card in self.additional_info_cards + self.solar_events:
+            self.style_info_card(card, card_bg, primary_col, secondary_col)
+
+        # 2. Lifestyle Cards (placeholders or AI content)
+        self.trivia_card.content.controls[0].controls[0].color = primary_col # Icon
+        self.trivia_card.content.controls[0].controls[1].color = primary_col # Title
+        self.trivia_card.content.controls[1].color = secondary_col # Text
+        
+        self.music_card.content.controls[0].controls[0].color = primary_col 
+        self.music_card.content.controls[0].controls[1].color = primary_col
+        self.music_card.content.controls[1].color = secondary_col
+        self.music_card.content.controls[2].color = secondary_col
+        
+        # 3. Forecast temperatures and colors
         self.update_forecast_display()
 
     def update_forecast_display(self):
-        """Rebuild forecast cards with current unit."""
-        if not self.forecast_data:
+        """Fill the forecast cards for the current unit and theme.
+        
+        Cards from the current forecast are patched in place; they are
+        only built when the forecast itself changes. The caller sends the
+        changes (page.update() or forecast_row.update()).
+        """
+        forecast = self.forecast
+        if not forecast:
             return
 
-        self.forecast_cards.clear()
-        daily_data = [item for item in self.forecast_data['list'] if "12:00:00" in item['dt_txt']]
+        daily = self.forecast_view == "daily"
+        view = forecast.daily() if daily else forecast.hourly(hours=3)
+        self.forecast_title.value = "5-Day Forecast" if daily else "24-Hour Forecast"
+        self.forecast_view_button.text = "Hourly" if daily else "Daily"
+
+        if len(self.forecast_cards) != len(view):
+            self.forecast_cards[:] = [self.create_forecast_card() for _ in range(len(view))]
+            self.forecast_row.controls = self.forecast_cards
         
         is_dark = self.page.theme_mode == ft.ThemeMode.DARK
         card_bg = "#2D3748" if is_dark else "#FFFFFF"
         text_col = "#F7FAFC" if is_dark else "#1A202C"
         sub_col = "#A0AEC0" if is_dark else "#718096"
         
-        for item in daily_data[:5]:
-            f_date_str = item['dt_txt']
-            f_date = datetime.datetime.strptime(f_date_str, "%Y-%m-%d %H:%M:%S")
-            f_day = f_date.strftime("%a")
-            
-            # Get base temp (Metric)
-            f_temp = item['main']['temp']
+        for i, card in enumerate(self.forecast_cards):
+            # Get base temps (Metric)
+            f_max = view.temp_max[i]
+            f_min = view.temp_min[i]
             
             # Convert if needed
             if self.current_unit == "imperial":
-                f_temp = (f_temp * 9/5) + 32
-                
-            f_icon = item['weather'][0]['icon']
+                f_max = (f_max * 9/5) + 32
+                f_min = (f_min * 9/5) + 32
             
-            card = ft.Container(
-                content=ft.Column(
-                    [
-                        ft.Text(f_day, weight=ft.FontWeight.BOLD, color=sub_col),
-                        ft.Image(src=f"https://openweathermap.org/img/wn/{f_icon}.png", width=50, height=50),
-                        ft.Text(f"{f_temp:.0f}°", weight=ft.FontWeight.BOLD, color=text_col),
-                    ],
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                    spacing=2,
-                ),
-                padding=10,
-                width=80,
-                bgcolor=card_bg,
-                border_radius=10,
-            )
-            self.forecast_cards.append(card)
+            tooltip = view.conditions[i]
+            if view.precip[i]:
+                tooltip += f", {view.precip[i]:.1f} mm"
             
-        self.forecast_row.controls = self.forecast_cards
-        
-        # ONLY UPDATE IF ADDED TO PAGE
-        if self.forecast_row.page:
-            self.forecast_row.update()
+            # AI content for the day, once the batch request has filled it in
+            lifestyle = self.forecast_lifestyle.get(view.starts[i]) if daily else None
+            if lifestyle:
+                tooltip += f"\n{lifestyle['music']}\n{lifestyle['fact']}"
+            
+            day_text, icon, temp_text = card.content.controls
+            day_text.value = view.labels[i]
+            day_text.color = sub_col
+            icon.src = self.icon_store.src(view.icons[i])
+            temp_text.value = f"{f_max:.0f}°/{f_min:.0f}°" if daily else f"{f_max:.0f}°"
+            temp_text.color = text_col
+            card.bgcolor = card_bg
+            card.tooltip = tooltip
+
+    def toggle_forecast_view(self, e):
+        """Switch the forecast between the daily and 3-hourly views."""
+        self.forecast_view = "hourly" if self.forecast_view == "daily" else "daily"
+        self.update_forecast_display()
+        self.page.update()
+
+    def create_forecast_card(self):
+        """Create an empty forecast card (filled by update_forecast_display)."""
+        return ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text("", weight=ft.FontWeight.BOLD),
+                    ft.Image(src="", width=50, height=50),
+                    ft.Text("", weight=ft.FontWeight.BOLD),
+                ],
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                spacing=2,
+            ),
+            padding=10,
+            width=80,
+            border_radius=10,
+        )
 
     def build_ui(self):
         """Build the user interface."""
@@ -335,8 +469,9 @@ class WeatherApp:
             view_elevation=0,
             divider_color=ft.Colors.TRANSPARENT,
             bar_hint_text="Enter city name (e.g. London)",
-            view_hint_text="Recent searches...",
+            view_hint_text="Type a city, or pick a recent search...",
             on_submit=self.on_search,
+            on_change=self.on_search_change,
             on_tap=lambda e: self.search_bar.open_view(),
             
             # Default Light Mode Styles
@@ -419,6 +554,65 @@ class WeatherApp:
             self.page.close(self.current_alert)
             self.current_alert = None
 
+    def dismiss_banner(self, e=None):
+        """Close the banner and keep it closed while the same alerts hold for the city."""
+        self.dismissed_alert = self.alert_key
+        self.close_banner()
+
+    async def locate(self):
+        """Detect the user's location by IP.
+        
+        Returns the ipapi.co payload, or None if the lookup failed.
+        A successful lookup is remembered as the last known location.
+        """
+        try:
+            data = await self.weather_service.get_current_location()
+        except Exception as e:
+            print(f"DEBUG: Location lookup failed: {str(e)}")
+            return None
+        
+        if data.get('city'):
+            self.weather_cache.set_last_location(
+                data['city'], data.get('latitude'), data.get('longitude')
+            )
+        return data
+
+    async def show_location_weather(self, city, lat, lon):
+        """Fetch and display weather for a detected location."""
+        self.search_bar.value = city
+        self.search_bar.update()
+        if lat is not None and lon is not None:
+            await self.get_weather_at(lat, lon)
+        else:
+            await self.get_weather()
+
+    async def load_startup_weather(self):
+        """Show weather for the last known location, then confirm it by IP.
+        
+        The last detected place is shown straight away (from the cache or
+        the API) while IP geolocation runs concurrently; the view is only
+        re-rendered if the user turns out to be in a different city.
+        """
+        last = self.weather_cache.get_last_location()
+        if not last:
+            await self.get_current_location_weather()
+            return
+        
+        locating = asyncio.ensure_future(self.locate())
+        await self.show_location_weather(last["city"], last["lat"], last["lon"])
+        shown_key = self.displayed_key
+        
+        data = await locating
+        city = data.get('city', '') if data else ''
+        if not city or city.strip().lower() == last["city"].strip().lower():
+            return
+        
+        # Leave the view alone if the user has already moved on
+        if self.displayed_key != shown_key:
+            return
+        print(f"DEBUG: Location changed from {last['city']} to {city}")
+        await self.show_location_weather(city, data.get('latitude'), data.get('longitude'))
+
     async def get_current_location_weather(self):
         """Get weather for current location using IP."""
         self.loading.visible = True
@@ -426,126 +620,116 @@ class WeatherApp:
         self.weather_container.visible = False
         self.page.update()
         
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get("https://ipapi.co/json/")
-                data = response.json()
-                city = data.get('city', '')
-                
-                if city:
-                    self.search_bar.value = city
-                    self.search_bar.update()
-                    await self.get_weather()
-                else:
-                    self.show_error("Could not detect your city name.")
-                    self.loading.visible = False
-                    self.page.update()
-        except Exception as e:
+        data = await self.locate()
+        if data is None:
             self.show_error("Could not detect your location.")
             self.loading.visible = False
             self.page.update()
+        elif not data.get('city'):
+            self.show_error("Could not detect your city name.")
+            self.loading.visible = False
+            self.page.update()
+        else:
+            await self.show_location_weather(data['city'], data.get('latitude'), data.get('longitude'))
 
     def on_search(self, e):
         """Handle search button click or enter key press."""
-        if self.current_alert:
-            self.close_banner()
-
         current_val = self.search_bar.value
-        if current_val:
-            self.search_bar.close_view(current_val)
-        self.page.run_task(self.get_weather)
+        with tracer.trace("on_search", query=current_val):
+            if self.current_alert:
+                self.close_banner()
 
-    def get_weather_warnings(self, data: dict):
-        """Analyze weather data and return a warning."""
-        temp = data.get("main", {}).get("temp", 0)
-        wind = data.get("wind", {}).get("speed", 0)
-        weather_desc = data.get("weather", [{}])[0].get("main", "").lower()
-        
-        warning = None
-        if temp > 35:
-            warning = {
-                "msg": f"🔥 Extreme Heat Alert! ({temp:.1f}°C)\nWear sunscreen.",
-                "color": ft.Colors.RED_100,
-                "icon": ft.Icons.LOCAL_FIRE_DEPARTMENT,
-                "icon_color": ft.Colors.RED
-            }
-        elif temp > 30:
-            warning = {
-                "msg": f"☀️ High Temp Warning ({temp:.1f}°C)\nStay hydrated.",
-                "color": ft.Colors.AMBER_100,
-                "icon": ft.Icons.WARNING,
-                "icon_color": ft.Colors.AMBER
-            }
-        elif temp < 5:
-            warning = {
-                "msg": f"❄️ Freeze Warning! ({temp:.1f}°C)",
-                "color": ft.Colors.BLUE_100,
-                "icon": ft.Icons.AC_UNIT,
-                "icon_color": ft.Colors.BLUE
-            }
-        elif wind > 15:
-            warning = {
-                "msg": f"💨 High Wind Alert! ({wind} m/s)",
-                "color": ft.Colors.GREY_300,
-                "icon": ft.Icons.AIR,
-                "icon_color": ft.Colors.GREY_700
-            }
-        elif "rain" in weather_desc:
-            warning = {
-                "msg": "🌧️ Rain Detected. Bring an umbrella!",
-                "color": ft.Colors.BLUE_GREY_100,
-                "icon": ft.Icons.UMBRELLA,
-                "icon_color": ft.Colors.BLUE_GREY_700
-            }
-        return warning
+            if current_val:
+                self.search_bar.close_view(current_val)
+            self.page.run_task(self.get_weather)
+
+    def get_weather_warnings(self, data: dict, forecast: Forecast = None):
+        """Current and upcoming alerts for the place, most important first."""
+        return self.alert_engine.evaluate(data, forecast)
 
     # --- LIFESTYLE METHOD ---
-    async def get_lifestyle_content(self, weather_main, temp, city, timezone_offset):
-        """Get lifestyle content (AI or Hardcoded fallback)."""
+    def get_time_of_day(self, timezone_offset, timestamp=None):
+        """Time of day at the city, from its UTC offset in seconds.
         
-        utc_now = datetime.datetime.utcnow()
+        Uses the current time unless a UTC epoch timestamp is given.
+        """
+        if timestamp is None:
+            utc_now = datetime.datetime.utcnow()
+        else:
+            utc_now = datetime.datetime.utcfromtimestamp(timestamp)
         local_time = utc_now + datetime.timedelta(seconds=timezone_offset)
         hour = local_time.hour
         
         if 5 <= hour < 12:
-            time_of_day = "morning"
+            return "morning"
         elif 12 <= hour < 17:
-            time_of_day = "afternoon"
+            return "afternoon"
         elif 17 <= hour < 21:
-            time_of_day = "evening"
+            return "evening"
         else:
-            time_of_day = "night"
+            return "night"
+
+    def get_music_icon(self, weather_main):
+        """Icon for the music card matching the weather condition."""
+        icon_map = {
+            "clear": ft.Icons.WB_SUNNY,
+            "cloud": ft.Icons.CLOUD_QUEUE,
+            "rain": ft.Icons.WATER_DROP,
+            "thunder": ft.Icons.FLASH_ON,
+            "snow": ft.Icons.AC_UNIT
+        }
+        
+        weather_key = weather_main.lower()
+        for key, val in icon_map.items():
+            if key in weather_key:
+                return val
+        return ft.Icons.MUSIC_NOTE
 
-        # 1. Try AI Generation
+    @tracer.traced("get_lifestyle_content")
+    async def get_lifestyle_content(self, weather_main, temp, city, timezone_offset):
+        """Get AI lifestyle content, or None if the AI had nothing usable.
+        
+        Returns a dict with whichever of 'fact', 'music' and 'explanation'
+        the AI produced; the caller fills the rest.
+        """
+        time_of_day = self.get_time_of_day(timezone_offset)
+
+        task = asyncio.ensure_future(
+            self.ai_service.generate_lifestyle_content(
+                weather_main, temp, city, time_of_day, use_fallback=False
+            )
+        )
+        self.ai_task = task
         try:
-            ai_content = await self.ai_service.generate_lifestyle_content(weather_main, temp, city, time_of_day)
-            
-            # Icon mapping
-            icon_map = {
-                "clear": ft.Icons.WB_SUNNY,
-                "cloud": ft.Icons.CLOUD_QUEUE,
-                "rain": ft.Icons.WATER_DROP,
-                "thunder": ft.Icons.FLASH_ON,
-                "snow": ft.Icons.AC_UNIT
-            }
-            
-            icon = ft.Icons.MUSIC_NOTE
-            weather_key = weather_main.lower()
-            for key, val in icon_map.items():
-                if key in weather_key:
-                    icon = val
-                    break
-            
-            return {
-                "fact": ai_content.get("fact", "Weather is interesting!"),
-                "music": ai_content.get("music", "Weather with You - Crowded House"),
-                "explanation": ai_content.get("music_explanation", "Fits the vibe."),
-                "music_icon": icon,
-                "fact_icon": ft.Icons.LIGHTBULB,
-            }
-            
-        except Exception:
-            return self.get_hardcoded_lifestyle(weather_main)
+            ai_content = await task
+        except asyncio.CancelledError:
+            # cancel_lifestyle() replaced the task: the user moved on
+            if self.ai_task is not task:
+                return None
+            raise
+        except Exception as e:
+            print(f"DEBUG: Lifestyle content failed: {str(e)}")
+            registry.counter("ai.errors").inc()
+            return None
+        
+        if not ai_content:
+            return None
+        return {
+            ("explanation" if field == "music_explanation" else field): value
+            for field, value in ai_content.items()
+        }
+
+    def cancel_lifestyle(self):
+        """Cancel the AI request for a city the user is navigating away from."""
+        if self.ai_task and not self.ai_task.done():
+            self.ai_task.cancel()
+        self.ai_task = None
+        if self.lifestyle_task and not self.lifestyle_task.done():
+            self.lifestyle_task.cancel()
+        self.lifestyle_task = None
+        if self.warm_task and not self.warm_task.done():
+            self.warm_task.cancel()
+        self.warm_task = None
 
     def get_hardcoded_lifestyle(self, weather_main):
         """Fallback hardcoded content."""
@@ -576,13 +760,31 @@ class WeatherApp:
             
         return content
 
+    @tracer.traced("display_weather")
     async def display_weather(self, data: dict, forecast_data: dict = None, is_cached: bool = False, timestamp: datetime.datetime = None, is_offline: bool = False):
         """Display weather information with cache status."""
+        forecast = Forecast.from_payload(forecast_data) if forecast_data else None
+        icon_code = data.get("weather", [{}])[0].get("icon", "01d")
+        
+        # Have the icons on disk before the cards are built; offline, use what is there
+        self.display_id += 1
+        display_id = self.display_id
+        icon_codes = {icon_code}
+        if forecast:
+            icon_codes.update(forecast.daily().icons)
+            icon_codes.update(forecast.hourly(hours=3).icons)
+        with tracer.span("icons.prefetch", icons=len(icon_codes)):
+            await self.icon_store.prefetch(icon_codes, timeout=0 if is_offline else Config.ICON_PREFETCH_TIMEOUT)
+        if display_id != self.display_id:
+            return  # a newer display started while the icons were loading
+        build_span = tracer.begin("build_controls")
+        
         city_name = data.get("name", "Unknown")
         country = data.get("sys", {}).get("country", "")
         
         # Save data for re-coloring later
         self.last_weather_data = data
+        self.displayed_key = self.weather_cache.canonical_key(data)
         
         # --- COLOR PALETTE SETUP ---
         is_dark = self.page.theme_mode == ft.ThemeMode.DARK
@@ -611,29 +813,23 @@ class WeatherApp:
         self.current_temp = data.get("main", {}).get("temp", 0)
         self.current_feels_like = data.get("main", {}).get("feels_like", 0)
         self.forecast_data = forecast_data 
+        self.forecast = forecast
+        self.forecast_lifestyle = {}
         
         self.unit_button.text = "°C"
         self.unit_button.update()
         
-        humidity = data.get("main", {}).get("humidity", 0)
         weather_main = data.get("weather", [{}])[0].get("main", "")
         description = data.get("weather", [{}])[0].get("description", "").title()
-        icon_code = data.get("weather", [{}])[0].get("icon", "01d")
-        wind_speed = data.get("wind", {}).get("speed", 0)
-        pressure = data.get("main", {}).get("pressure", 0)
-        wind_gust = data.get("wind", {}).get("gust", 0)
-        
         timezone_offset = data.get("timezone", 0)
-        sunrise = datetime.datetime.utcfromtimestamp(data.get("sys", {}).get("sunrise", 0) + timezone_offset).strftime("%I:%M %p")
-        sunset = datetime.datetime.utcfromtimestamp(data.get("sys", {}).get("sunset", 0) + timezone_offset).strftime("%I:%M %p")
-        date_display = datetime.datetime.utcfromtimestamp(data.get("dt", 0) + timezone_offset)
+        humidity, wind_speed, wind_gust, pressure, sunrise, sunset = self.get_detail_values(data)
         
         self.additional_info_row = ft.Row(
             [
-                self.create_info_card(ft.Icons.WATER_DROP, "Humidity", f'{humidity}%', card_bg, text_primary, text_secondary),
-                self.create_info_card(ft.Icons.AIR, "Wind Speed", f'{wind_speed} m/s', card_bg, text_primary, text_secondary),
-                self.create_info_card(ft.Icons.WIND_POWER, "Gustiness", f'{wind_gust} m/s', card_bg, text_primary, text_secondary),
-                self.create_info_card(ft.Icons.GAS_METER, "Pressure", f'{pressure} hPa', card_bg, text_primary, text_secondary),
+                self.create_info_card(ft.Icons.WATER_DROP, "Humidity", humidity, card_bg, text_primary, text_secondary),
+                self.create_info_card(ft.Icons.AIR, "Wind Speed", wind_speed, card_bg, text_primary, text_secondary),
+                self.create_info_card(ft.Icons.WIND_POWER, "Gustiness", wind_gust, card_bg, text_primary, text_secondary),
+                self.create_info_card(ft.Icons.GAS_METER, "Pressure", pressure, card_bg, text_primary, text_secondary),
             ],
             scroll="adaptive", alignment=ft.MainAxisAlignment.SPACE_EVENLY
         )
@@ -641,13 +837,19 @@ class WeatherApp:
         
         self.solar_row = ft.Row(
             [
-                self.create_info_card(ft.Icons.SUNNY, "Sunrise", f'{sunrise}', card_bg, text_primary, text_secondary),
-                self.create_info_card(ft.Icons.SUNNY, "Sunset", f'{sunset}', card_bg, text_primary, text_secondary)
+                self.create_info_card(ft.Icons.SUNNY, "Sunrise", sunrise, card_bg, text_primary, text_secondary),
+                self.create_info_card(ft.Icons.SUNNY, "Sunset", sunset, card_bg, text_primary, text_secondary)
             ],
             alignment=ft.MainAxisAlignment.SPACE_EVENLY
         )
         self.solar_events = self.solar_row.controls
 
+        # Store main text controls for easier updating later
+        self.location_text = ft.Text(f"{city_name}, {country}", size=30, weight=ft.FontWeight.BOLD, color=text_primary, text_align=ft.TextAlign.CENTER, no_wrap=False)
+        self.solar_title = ft.Text("Sunrise and Sunset", size=24, weight=ft.FontWeight.BOLD, color=text_primary)
+        self.forecast_title = ft.Text("5-Day Forecast", size=24, weight=ft.FontWeight.BOLD, color=text_primary)
+        self.forecast_view_button = ft.TextButton("Hourly", on_click=self.toggle_forecast_view)
+
         self.forecast_cards = []
         self.forecast_row = ft.Row(
             self.forecast_cards, 
@@ -656,11 +858,6 @@ class WeatherApp:
         )
         self.update_forecast_display() 
 
-        # Store main text controls for easier updating later
-        self.location_text = ft.Text(f"{city_name}, {country}", size=30, weight=ft.FontWeight.BOLD, color=text_primary, text_align=ft.TextAlign.CENTER, no_wrap=False)
-        self.solar_title = ft.Text("Sunrise and Sunset", size=24, weight=ft.FontWeight.BOLD, color=text_primary)
-        self.forecast_title = ft.Text("5-Day Forecast", size=24, weight=ft.FontWeight.BOLD, color=text_primary)
-
         self.temperature = ft.Text(
             f"{self.current_temp:.1f}°C",
             size=48,
@@ -675,17 +872,19 @@ class WeatherApp:
         )
         
         self.description = ft.Text(description, size=16, italic=True, color=text_secondary)
+        self.weather_icon = ft.Image(src=self.icon_store.src(icon_code, "@2x"), width=120, height=120)
+        self.footer = ft.Text(footer_text, size=12, italic=True, color=footer_color)
 
-        # --- GET LIFESTYLE CONTENT WITH TIMEZONE ---
-        lifestyle = await self.get_lifestyle_content(weather_main, self.current_temp, city_name, timezone_offset)
-        self.last_lifestyle_data = lifestyle # Save for theme toggling
+        # --- LIFESTYLE PLACEHOLDERS (filled in by load_lifestyle) ---
+        # A new render supersedes any AI request for the previous one
+        self.cancel_lifestyle()
         
         # Trivia Card
         self.trivia_card = ft.Container(
             content=ft.Column(
                 [
-                    ft.Row([ft.Icon(lifestyle["fact_icon"], size=16, color=text_primary), ft.Text("Trivia", size=12, weight=ft.FontWeight.BOLD, color=text_primary)], alignment=ft.MainAxisAlignment.CENTER),
-                    ft.Text(lifestyle["fact"], size=12, italic=True, no_wrap=False, text_align=ft.TextAlign.CENTER, color=text_secondary),
+                    ft.Row([ft.Icon(ft.Icons.LIGHTBULB, size=16, color=text_primary), ft.Text("Trivia", size=12, weight=ft.FontWeight.BOLD, color=text_primary)], alignment=ft.MainAxisAlignment.CENTER),
+                    ft.Text("Finding a fun fact...", size=12, italic=True, no_wrap=False, text_align=ft.TextAlign.CENTER, color=text_secondary),
                 ],
                 alignment=ft.MainAxisAlignment.CENTER,
                 horizontal_alignment=ft.CrossAxisAlignment.CENTER,
@@ -699,9 +898,9 @@ class WeatherApp:
         self.music_card = ft.Container(
             content=ft.Column(
                 [
-                    ft.Row([ft.Icon(lifestyle["music_icon"], size=16, color=text_primary), ft.Text("Music", size=12, weight=ft.FontWeight.BOLD, color=text_primary)], alignment=ft.MainAxisAlignment.CENTER),
-                    ft.Text(lifestyle["music"], size=12, italic=True, no_wrap=False, text_align=ft.TextAlign.CENTER, color=text_secondary),
-                    ft.Text(f"({lifestyle['explanation']})", size=10, color=text_secondary, text_align=ft.TextAlign.CENTER),
+                    ft.Row([ft.Icon(ft.Icons.MUSIC_NOTE, size=16, color=text_primary), ft.Text("Music", size=12, weight=ft.FontWeight.BOLD, color=text_primary)], alignment=ft.MainAxisAlignment.CENTER),
+                    ft.Text("Picking a song...", size=12, italic=True, no_wrap=False, text_align=ft.TextAlign.CENTER, color=text_secondary),
+                    ft.Text("", size=10, color=text_secondary, text_align=ft.TextAlign.CENTER),
                 ],
                 alignment=ft.MainAxisAlignment.CENTER,
                 horizontal_alignment=ft.CrossAxisAlignment.CENTER,
@@ -724,7 +923,7 @@ class WeatherApp:
                         ft.Column(
                             [
                                 ft.Container(
-                                    content=ft.Image(src=f"https://openweathermap.org/img/wn/{icon_code}@2x.png", width=120, height=120),
+                                    content=self.weather_icon,
                                     margin=ft.Margin(0, -11, 0, 0)
                                 ),
                                 self.description,
@@ -754,10 +953,13 @@ class WeatherApp:
                 ft.Divider(),
                 
                 # 7. Forecast
-                self.forecast_title,
+                ft.Row(
+                    [self.forecast_title, self.forecast_view_button],
+                    alignment=ft.MainAxisAlignment.CENTER,
+                ),
                 self.forecast_row,
                 
-                ft.Text(footer_text, size=12, italic=True, color=footer_color)
+                self.footer,
             ],
             horizontal_alignment=ft.CrossAxisAlignment.CENTER,
             spacing=10,
@@ -766,33 +968,281 @@ class WeatherApp:
         self.weather_container.animate_opacity = 300
         self.weather_container.opacity = 0
         self.weather_container.visible = True
+        tracer.end(build_span)
         self.page.update()
 
-        warning = self.get_weather_warnings(data)
-        if warning:
-            self.current_alert = ft.Banner(
-                bgcolor=warning["color"],
-                leading=ft.Icon(warning["icon"], color=warning["icon_color"], size=40),
-                content=ft.Text(warning["msg"], color=ft.Colors.BLACK),
-                actions=[
-                    ft.TextButton("Dismiss", on_click=self.close_banner)
-                ],
+        self.show_alerts(data)
+
+        # Fetch AI content after the weather is on screen
+        self.render_id += 1
+        self.last_lifestyle_data = self.get_hardcoded_lifestyle(weather_main)
+        self.lifestyle_key = self.ai_service.cache.make_key(
+            city_name, weather_main, self.current_temp, self.get_time_of_day(timezone_offset)
+        )
+        self.lifestyle_task = asyncio.ensure_future(
+            self.load_lifestyle(self.render_id, weather_main, self.current_temp, city_name, timezone_offset)
+        )
+        if self.forecast and self.ai_service.enabled:
+            self.warm_task = asyncio.ensure_future(
+                self.warm_lifestyle(self.render_id, city_name, self.forecast, timezone_offset)
             )
-            self.page.open(self.current_alert)
 
         await asyncio.sleep(0.1)
         self.weather_container.opacity = 1
         self.error_message.visible = False
         self.page.update()
 
-    async def get_weather(self):
-        """Fetch and display weather data."""
-        city = self.search_bar.value.strip() if self.search_bar.value else ""
+    def get_detail_values(self, data: dict):
+        """Humidity, wind speed, gust, pressure, sunrise and sunset as shown on the info cards."""
+        timezone_offset = data.get("timezone", 0)
+        sunrise = datetime.datetime.utcfromtimestamp(data.get("sys", {}).get("sunrise", 0) + timezone_offset).strftime("%I:%M %p")
+        sunset = datetime.datetime.utcfromtimestamp(data.get("sys", {}).get("sunset", 0) + timezone_offset).strftime("%I:%M %p")
+        return (
+            f'{data.get("main", {}).get("humidity", 0)}%',
+            f'{data.get("wind", {}).get("speed", 0)} m/s',
+            f'{data.get("wind", {}).get("gust", 0)} m/s',
+            f'{data.get("main", {}).get("pressure", 0)} hPa',
+            sunrise,
+            sunset,
+        )
+
+    def show_alerts(self, data: dict):
+        """Open the alert banner for the displayed weather, if any rule fires."""
+        warnings = self.get_weather_warnings(data, self.forecast)
+        self.alert_key = (data.get("id") or data.get("name"), tuple(w.rule.name for w in warnings))
+        if warnings and self.alert_key != self.dismissed_alert:
+            color, icon, icon_color = ALERT_STYLES.get(warnings[0].rule.name, DEFAULT_ALERT_STYLE)
+            if self.alert_banner is None:
+                self.alert_banner = ft.Banner(
+                    content=ft.Column([], spacing=2, tight=True),
+                    actions=[
+                        ft.TextButton("Dismiss", on_click=self.dismiss_banner)
+                    ],
+                )
+            banner = self.alert_banner
+            banner.bgcolor = color
+            banner.leading = ft.Icon(icon, color=icon_color, size=40)
+            banner.content.controls = [
+                ft.Text(w.message, color=ft.Colors.BLACK, weight=ft.FontWeight.BOLD if i == 0 else None)
+                for i, w in enumerate(warnings)
+            ]
+            self.current_alert = banner
+            self.page.open(banner)
+
+    @tracer.traced("refresh_weather")
+    async def refresh_weather(self, data: dict, forecast_data: dict = None):
+        """Swap fresh data for the same city into the controls on screen.
+        
+        Used by background refreshes: only the weather values change. The
+        selected unit, forecast view and the AI lifestyle cards are kept.
+        """
+        forecast = Forecast.from_payload(forecast_data) if forecast_data else None
+        icon_code = data.get("weather", [{}])[0].get("icon", "01d")
+        
+        icon_codes = {icon_code}
+        if forecast:
+            icon_codes.update(forecast.daily().icons)
+            icon_codes.update(forecast.hourly(hours=3).icons)
+        display_id = self.display_id
+        with tracer.span("icons.prefetch", icons=len(icon_codes)):
+            await self.icon_store.prefetch(icon_codes)
+        if display_id != self.display_id:
+            return  # another city was displayed meanwhile
+        
+        self.last_weather_data = data
+        self.forecast_data = forecast_data
+        self.forecast = forecast
+        
+        temp = data.get("main", {}).get("temp", 0)
+        feels_like = data.get("main", {}).get("feels_like", 0)
+        if self.current_unit == "imperial":
+            temp = (temp * 9/5) + 32
+            feels_like = (feels_like * 9/5) + 32
+        self.current_temp = temp
+        self.current_feels_like = feels_like
+        
+        city_name = data.get("name", "Unknown")
+        country = data.get("sys", {}).get("country", "")
+        self.location_text.value = f"{city_name}, {country}"
+        self.description.value = data.get("weather", [{}])[0].get("description", "").title()
+        self.weather_icon.src = self.icon_store.src(icon_code, "@2x")
+        for card, value in zip(self.additional_info_cards + self.solar_events, self.get_detail_values(data)):
+            card.content.controls[2].value = value
+        self.footer.value = "Live Data"
+        self.footer.color = "#A0AEC0" if self.page.theme_mode == ft.ThemeMode.DARK else "#718096"
+        
+        # Temperatures, colors and forecast cards for the current unit
+        self.update_display()
+        self.page.update()
+        
+        self.close_banner()
+        self.show_alerts(data)
+
+    @tracer.traced("load_lifestyle")
+    async def load_lifestyle(self, render_id, weather_main, temp, city, timezone_offset):
+        """Fill the trivia and music cards, hedged against slow AI responses.
+        
+        AI fields are shown as they arrive. Whatever the AI has not filled
+        within Config.AI_FALLBACK_DEADLINE is shown from the hardcoded
+        content, and upgraded in place if the AI finishes within a further
+        Config.AI_UPGRADE_WINDOW. Results for a render that has since been
+        replaced are dropped.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        sources = {}  # field -> "ai" or "fallback"
+        fell_back = False
+        
+        task = asyncio.ensure_future(
+            self.receive_lifestyle(render_id, sources, weather_main, temp, city, timezone_offset)
+        )
+        try:
+            done, _ = await asyncio.wait({task}, timeout=Config.AI_FALLBACK_DEADLINE)
+            if render_id != self.render_id:
+                return
+            
+            fallback = self.get_hardcoded_lifestyle(weather_main)
+            for field in ("fact", "music", "explanation"):
+                if field not in sources:
+                    self.show_lifestyle_field(sources, field, fallback[field], "fallback")
+                    fell_back = True
+            
+            # Keep the AI request running for a late upgrade
+            if fell_back and not done:
+                await asyncio.wait({task}, timeout=Config.AI_UPGRADE_WINDOW)
+        finally:
+            task.cancel()
+        
+        if render_id != self.render_id:
+            return
+        
+        if not fell_back:
+            outcome = "ai"
+        elif all(source == "ai" for source in sources.values()):
+            outcome = "upgraded"
+        else:
+            outcome = "fallback"
+        registry.counter(f"ai.outcome.{outcome}").inc()
+        registry.histogram("ai.outcome_latency").observe(loop.time() - started)
+        print(f"DEBUG: Lifestyle content: {outcome} after {loop.time() - started:.2f}s")
+
+    async def receive_lifestyle(self, render_id, sources, weather_main, temp, city, timezone_offset):
+        """Show AI lifestyle fields as they arrive (streamed or all at once)."""
+        if Config.AI_STREAMING:
+            time_of_day = self.get_time_of_day(timezone_offset)
+            with tracer.span("stream_lifestyle_content"):
+                async for field, value in self.ai_service.stream_lifestyle_content(
+                    weather_main, temp, city, time_of_day, use_fallback=False
+                ):
+                    if render_id != self.render_id:
+                        return
+                    if field == "music_explanation":
+                        field = "explanation"
+                    self.show_lifestyle_field(sources, field, value, "ai", weather_main)
+        else:
+            content = await self.get_lifestyle_content(weather_main, temp, city, timezone_offset)
+            if content is None or render_id != self.render_id:
+                return
+            for field, value in content.items():
+                self.show_lifestyle_field(sources, field, value, "ai", weather_main)
+
+    def show_lifestyle_field(self, sources, field, value, source, weather_main=""):
+        """Put one lifestyle field on its card and record where it came from."""
+        trivia = self.trivia_card.content.controls
+        music = self.music_card.content.controls
+        lifestyle = self.last_lifestyle_data
+        
+        if field == "fact":
+            trivia[0].controls[0].name = lifestyle["fact_icon"] = ft.Icons.LIGHTBULB
+            trivia[1].value = value
+            card = self.trivia_card
+        elif field == "music":
+            if source == "ai":
+                lifestyle["music_icon"] = self.get_music_icon(weather_main)
+            music[0].controls[0].name = lifestyle["music_icon"]
+            music[1].value = value
+            card = self.music_card
+        else:
+            music[2].value = f"({value})"
+            card = self.music_card
+        
+        lifestyle[field] = value
+        sources[field] = source
+        if card.page:
+            card.update()
+
+    @tracer.traced("warm_lifestyle")
+    async def warm_lifestyle(self, render_id, city, forecast, timezone_offset):
+        """Batch-generate AI content for the forecast days and recent searches.
+        
+        One Gemini request covers every forecast day shown plus the history
+        cities with cached weather, so revisiting those cities is instant.
+        A day with the same conditions as the lifestyle cards is not asked
+        for again; it gets their content from the cache.
+        """
+        days = forecast.daily()
+        items = [
+            (
+                city,
+                days.conditions[i],
+                days.temp_max[i],
+                self.get_time_of_day(timezone_offset, days.starts[i] + 12 * 3600),  # midday
+            )
+            for i in range(len(days))
+        ]
+        
+        for name in self.search_history:
+            entry = self.weather_cache.peek(self.weather_cache.query_key(name))
+            if entry is None or entry["weather"].get("name") == city:
+                continue
+            weather = entry["weather"]
+            items.append((
+                weather.get("name", name),
+                weather.get("weather", [{}])[0].get("main", ""),
+                weather.get("main", {}).get("temp", 0),
+                self.get_time_of_day(weather.get("timezone", 0)),
+            ))
+        
+        make_key = self.ai_service.cache.make_key
+        streaming = self.lifestyle_key
+        results = iter(await self.ai_service.generate_lifestyle_batch(
+            [item for item in items if make_key(*item) != streaming]
+        ))
+        if render_id != self.render_id:
+            return
+        
+        self.forecast_lifestyle = {}
+        for start, item in zip(days.starts, items):
+            content = self.ai_service.cache.get(streaming) if make_key(*item) == streaming else next(results)
+            if content:
+                self.forecast_lifestyle[start] = content
+        self.update_forecast_display()
+        if self.forecast_row.page:
+            self.forecast_row.update()
+
+    @tracer.traced("get_weather", root=True)
+    async def get_weather(self, city: CityRef = None):
+        """Fetch and display weather data.
+        
+        Uses the search bar text unless a city name or OWM city ID is given.
+        """
+        if city is None:
+            city = self.search_bar.value.strip() if self.search_bar.value else ""
         
         if not city:
             self.show_error("Please enter a city name")
             return
         
+        # Typed names go through the city index: unique names become IDs
+        # and misspellings are corrected before any request is made
+        if isinstance(city, str):
+            resolved = self.city_index.resolve(city)
+            if resolved is not None:
+                city = resolved
+        
+        # Drop AI content still being generated for the previous city
+        self.cancel_lifestyle()
+        
         self.loading.visible = True
         self.error_message.visible = False
         self.weather_container.visible = False
@@ -800,11 +1250,13 @@ class WeatherApp:
         
         # 1. CHECK CACHE FIRST
         now = datetime.datetime.now()
-        cache_key = city.lower()
+        cache_key = self.weather_cache.query_key(city)
         
-        if cache_key in self.weather_cache:
-            cached = self.weather_cache[cache_key]
-            if now - cached['timestamp'] < self.CACHE_DURATION:
+        with tracer.span("cache.get"):
+            cached = self.weather_cache.get(cache_key)
+        if cached:
+            age = now - cached['timestamp']
+            if age < self.CACHE_STALE_DURATION:
                 await self.display_weather(
                     cached['weather'], 
                     cached['forecast'], 
@@ -814,31 +1266,47 @@ class WeatherApp:
                 )
                 self.loading.visible = False
                 self.page.update()
+                
+                # Stale-while-revalidate: refresh old entries behind the scenes
+                if age >= self.CACHE_DURATION:
+                    self.page.run_task(self.revalidate_weather, city, cache_key)
                 return
 
-        # 2. FETCH FROM API
+        # 2. CIRCUIT OPEN: API is known to be down, go straight to the cache
+        if cached and self.weather_service.circuit_open:
+            await self.display_weather(
+                cached['weather'], 
+                cached['forecast'], 
+                is_cached=True, 
+                timestamp=cached['timestamp'],
+                is_offline=True
+            )
+            self.loading.visible = False
+            self.page.update()
+            return
+
+        # 3. FETCH FROM API
+        # With a cached copy to fall back on, one failed attempt is enough:
+        # show the copy now and keep retrying in the background
+        retry = cached is None
         try:
             weather_data, forecast_data = await asyncio.gather(
-                self.weather_service.get_weather(city),
-                self.weather_service.get_forecast(city)
+                tracer.run("fetch.weather", self.weather_service.get_weather(city, retry=retry)),
+                tracer.run("fetch.forecast", self.weather_service.get_forecast(city, retry=retry))
             )
             
-            # 3. SAVE TO CACHE
-            self.weather_cache[cache_key] = {
-                "weather": weather_data,
-                "forecast": forecast_data,
-                "timestamp": now
-            }
+            # 4. SAVE TO CACHE
+            self.weather_cache.put(cache_key, weather_data, forecast_data, now)
             
             await self.display_weather(weather_data, forecast_data, is_cached=False)
-            self.add_to_history(city)
+            # History holds names; ID lookups are recorded under the OWM name
+            name = city if isinstance(city, str) else weather_data.get("name")
+            if name:
+                self.add_to_history(name)
             
         except Exception as e:
-            # 4. OFFLINE FALLBACK
-            if cache_key in self.weather_cache:
-                cached = self.weather_cache[cache_key]
-                self.show_error("Offline Mode: Showing cached data.")
-                await asyncio.sleep(1.5) 
+            # 5. OFFLINE FALLBACK (works across restarts)
+            if cached:
                 await self.display_weather(
                     cached['weather'], 
                     cached['forecast'], 
@@ -846,6 +1314,7 @@ class WeatherApp:
                     timestamp=cached['timestamp'],
                     is_offline=True
                 )
+                self.page.run_task(self.revalidate_weather, city, cache_key)
             else:
                 self.show_error(str(e))
         
@@ -853,7 +1322,72 @@ class WeatherApp:
             self.loading.visible = False
             self.page.update()
     
+    @tracer.traced("get_weather_at", root=True)
+    async def get_weather_at(self, lat: float, lon: float):
+        """Fetch and display weather for a coordinate pair."""
+        self.cancel_lifestyle()
+        
+        # Nearby coordinates share the cache entry of the place they fall in
+        key = self.weather_cache.find_near(lat, lon)
+        if key:
+            place = self.weather_cache.get(key)["weather"]
+            await self.get_weather(place.get("id") or place.get("name"))
+            return
+        
+        self.loading.visible = True
+        self.error_message.visible = False
+        self.weather_container.visible = False
+        self.page.update()
+        
+        try:
+            weather_data, forecast_data = await asyncio.gather(
+                tracer.run("fetch.weather", self.weather_service.get_weather_by_coordinates(lat, lon)),
+                tracer.run("fetch.forecast", self.weather_service.get_forecast_by_coordinates(lat, lon))
+            )
+            if WeatherCache.canonical_key(weather_data):  # nameless points are not cached
+                self.weather_cache.put(None, weather_data, forecast_data)
+            
+            await self.display_weather(weather_data, forecast_data, is_cached=False)
+            if weather_data.get("name"):
+                self.add_to_history(weather_data["name"])
+            
+        except Exception as e:
+            self.show_error(str(e))
+        
+        finally:
+            self.loading.visible = False
+            self.page.update()
+
+    @tracer.traced("revalidate_weather")
+    async def revalidate_weather(self, city: CityRef, cache_key: str):
+        """Refresh a stale cache entry and swap it in if still on screen."""
+        if cache_key in self.revalidating:
+            return
+        self.revalidating.add(cache_key)
+        
+        try:
+            weather_data, forecast_data = await asyncio.gather(
+                tracer.run("fetch.weather", self.weather_service.get_weather(city, priority=BACKGROUND)),
+                tracer.run("fetch.forecast", self.weather_service.get_forecast(city, priority=BACKGROUND))
+            )
+            canonical = self.weather_cache.put(cache_key, weather_data, forecast_data)
+            
+            # The user may have moved on to another city meanwhile
+            if self.displayed_key == canonical:
+                await self.refresh_weather(weather_data, forecast_data)
+        except Exception as e:
+            # Keep showing the stale data
+            print(f"DEBUG: Background refresh failed for {city}: {str(e)}")
+        finally:
+            self.revalidating.discard(cache_key)
+
     # Accepts colors for dynamic theming
+    def style_info_card(self, card, bgcolor, text_primary, text_secondary):
+        """Recolor an info card made by create_info_card."""
+        card.bgcolor = bgcolor
+        card.content.controls[1].color = text_secondary
+        card.content.controls[2].color = text_primary
+
     def create_info_card(self, icon, label, value, bgcolor="#FFFFFF", text_primary="#1A202C", text_secondary="#718096"):
         """Create an info card for weather details."""
         return ft.Container(
@@ -884,4 +1418,5 @@ def main(page: ft.Page):
     WeatherApp(page)
 
 if __name__ == "__main__":
-    ft.app(target=main)
\ No newline at end of file
+    Config.validate()
+    ft.app(target=main, assets_dir=Config.ASSETS_DIR)
\ No newline at end of file
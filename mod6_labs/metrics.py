@@ -0,0 +1,135 @@
+# metrics.py
+"""In-process metrics registry: counters and fixed-bucket histograms."""
+
+import bisect
+from typing import Dict, Optional, Sequence
+
+# Upper bounds (seconds) for latency histograms
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+
+
+class Counter:
+    """Monotonically increasing count."""
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Histogram:
+    """
+    Distribution of observed values in fixed buckets.
+
+    Each bucket counts observations up to and including its upper bound;
+    a final overflow bucket counts everything larger. Count, sum, min and
+    max are tracked exactly; percentiles are estimated from the buckets.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-th percentile.
+
+        Args:
+            q: Percentile, 0-100
+
+        Returns:
+            The bucket bound (the observed max for the overflow bucket),
+            or None if nothing was observed
+        """
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict:
+        buckets = {f"<={bound:g}": count for bound, count in zip(self.buckets, self.counts)}
+        buckets["+inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "buckets": buckets,
+        }
+
+
+class Registry:
+    """
+    Named counters and histograms, created on first use.
+
+    Metrics are updated from the event loop only, so no locking is done.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+
+    def counter(self, name: str) -> Counter:
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters[name] = Counter()
+        return counter
+
+    def histogram(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(buckets)
+        return histogram
+
+    def value(self, name: str) -> int:
+        """Current value of a counter (0 if it was never incremented)."""
+        counter = self._counters.get(name)
+        return counter.value if counter else 0
+
+    def snapshot(self, prefix: str = "") -> Dict:
+        """
+        Current values of all metrics whose names start with `prefix`.
+
+        Returns:
+            Dict with 'counters' (name -> value) and 'histograms'
+            (name -> Histogram.snapshot())
+        """
+        return {
+            "counters": {
+                name: counter.value for name, counter in sorted(self._counters.items())
+                if name.startswith(prefix)
+            },
+            "histograms": {
+                name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())
+                if name.startswith(prefix)
+            },
+        }
+
+    def reset(self):
+        """Drop all metrics."""
+        self._counters.clear()
+        self._histograms.clear()
+
+
+# Process-wide registry
+registry = Registry()
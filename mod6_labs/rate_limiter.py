@@ -0,0 +1,155 @@
+# rate_limiter.py
+"""Client-side rate limiting for the OpenWeatherMap call quota."""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, Hashable, List, Optional
+
+# Priority lanes (lower value is served first)
+INTERACTIVE = 0  # user searches, history clicks, location button
+BACKGROUND = 1   # revalidation, bulk refreshes, prefetching
+
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class RateLimiter:
+    """
+    Async token bucket with priority lanes.
+
+    Tokens refill continuously at `rate_per_minute` up to `burst`. A caller
+    takes one token per request; when none are left it queues, and queued
+    callers are served lowest priority value first (FIFO within a lane),
+    so an interactive search jumps ahead of any waiting background work.
+    A queued request can be moved to a more urgent lane with promote().
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.burst = burst or max(1, int(rate_per_minute))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+        self._waiters: List[List] = []  # heap of [priority, seq, future, key]
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Stats
+        self._acquired = {lane: 0 for lane in LANE_NAMES}
+        self._waited = {lane: 0 for lane in LANE_NAMES}
+        self._wait_total = {lane: 0.0 for lane in LANE_NAMES}
+        self._wait_max = {lane: 0.0 for lane in LANE_NAMES}
+        self._max_queue_depth = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = INTERACTIVE, key: Optional[Hashable] = None):
+        """
+        Wait until a request may be sent.
+
+        Args:
+            priority: INTERACTIVE or BACKGROUND
+            key: Identifies the request for promote() while it waits
+        """
+        started = time.monotonic()
+        self._refill()
+
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            self._record(priority, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future, key]
+        heapq.heappush(self._waiters, entry)
+        self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                # Leave the queue now rather than when the dispatcher reaches us
+                self._waiters = [w for w in self._waiters if w[2] is not future]
+                heapq.heapify(self._waiters)
+            raise
+        self._record(entry[0], time.monotonic() - started)
+
+    def promote(self, key: Hashable, priority: int):
+        """
+        Move queued requests with the given key up to `priority`.
+
+        Args:
+            key: Key the requests were queued with (see acquire)
+            priority: New lane; requests already in a more urgent one stay
+        """
+        promoted = False
+        for entry in self._waiters:
+            if entry[3] == key and entry[0] > priority:
+                entry[0] = priority
+                promoted = True
+        if promoted:
+            heapq.heapify(self._waiters)
+
+    async def _dispatch(self):
+        """Hand out tokens to queued callers as they refill."""
+        while self._waiters:
+            self._refill()
+
+            # Drop callers that gave up
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                break
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                future = heapq.heappop(self._waiters)[2]
+                future.set_result(None)
+            else:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _record(self, priority: int, waited: float):
+        self._acquired[priority] += 1
+        if waited > 0:
+            self._waited[priority] += 1
+            self._wait_total[priority] += waited
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    def stats(self) -> Dict:
+        """
+        Snapshot of limiter state.
+
+        Returns:
+            Dict with available tokens, current and max queue depth, and
+            per-lane request counts and wait times (seconds)
+        """
+        self._refill()
+        queued = {name: 0 for name in LANE_NAMES.values()}
+        for priority, _, future, _ in self._waiters:
+            if not future.done():
+                queued[LANE_NAMES[priority]] += 1
+
+        lanes = {}
+        for lane, name in LANE_NAMES.items():
+            waited = self._waited[lane]
+            lanes[name] = {
+                "acquired": self._acquired[lane],
+                "queued": queued[name],
+                "waited": waited,
+                "avg_wait": self._wait_total[lane] / waited if waited else 0.0,
+                "max_wait": self._wait_max[lane],
+            }
+
+        return {
+            "tokens": round(self._tokens, 2),
+            "queue_depth": sum(queued.values()),
+            "max_queue_depth": self._max_queue_depth,
+            "lanes": lanes,
+        }
@@ -0,0 +1,110 @@
+# startup.py
+"""Cold-start helpers: lazy module imports and startup timing."""
+
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import time
+import types
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Imported first by main.py, so this is (close to) process start
+STARTED = time.perf_counter()
+
+_imports: List[Tuple[str, float]] = []  # (module group, seconds)
+_first_paint: Optional[float] = None
+_lazy: Set[str] = set()  # modules created by lazy_import()
+
+
+def lazy_import(name: str):
+    """
+    Import a module on first attribute access instead of right away.
+
+    Uses importlib's LazyLoader: the module object exists immediately (so
+    it can be bound at module level and named in except clauses), but its
+    code only runs the first time one of its attributes is used.
+
+    Args:
+        name: Absolute module name, e.g. "httpx"
+
+    Returns:
+        The (possibly not yet loaded) module
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    _lazy.add(name)
+    return module
+
+
+@contextlib.contextmanager
+def timed(label: str) -> Iterator[None]:
+    """Record how long the imports inside the block take."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _imports.append((label, time.perf_counter() - start))
+
+
+def first_paint():
+    """
+    Mark the first page.update() and print the startup report.
+
+    Only the first call counts. The report is also written as JSON to
+    $STARTUP_REPORT_PATH when that is set, so it can be tracked over time.
+    """
+    global _first_paint
+    if _first_paint is not None:
+        return
+    _first_paint = time.perf_counter() - STARTED
+
+    data = report()
+    print("DEBUG: Startup timing")
+    for label, ms in data["imports_ms"].items():
+        print(f"DEBUG:   import {label:<16} {ms:8.1f} ms")
+    print(f"DEBUG:   first page.update  {data['first_paint_ms']:8.1f} ms")
+
+    path = os.getenv("STARTUP_REPORT_PATH")
+    if path:
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+        except OSError as e:
+            print(f"DEBUG: Could not write startup report: {str(e)}")
+
+
+def report() -> Dict:
+    """
+    Startup timings so far.
+
+    Returns:
+        Dict with 'imports_ms' (per module group, in import order),
+        'first_paint_ms' (None before the first paint) and the list of
+        heavy modules already loaded
+    """
+    return {
+        "imports_ms": {label: round(seconds * 1000, 1) for label, seconds in _imports},
+        "first_paint_ms": round(_first_paint * 1000, 1) if _first_paint is not None else None,
+        "heavy_modules_loaded": [
+            name for name in ("google.generativeai", "httpx", "dotenv")
+            if name in sys.modules and not _is_lazy(name)
+        ],
+    }
+
+
+def _is_lazy(name: str) -> bool:
+    """Whether a lazy_import()ed module is still waiting to be loaded."""
+    # LazyLoader gives the module a stand-in class until its first
+    # attribute access, then turns it back into a plain module
+    return name in _lazy and type(sys.modules[name]) is not types.ModuleType
@@ -0,0 +1,127 @@
+# test_city_index.py
+"""Tests for city suggestions and searched-name resolution."""
+
+import pytest
+
+from city_index import CityIndex, build
+from config import Config
+
+CITIES = [
+    {"id": 2643743, "name": "London", "country": "GB"},
+    {"id": 4517009, "name": "London", "state": "OH", "country": "US"},
+    {"id": 6058560, "name": "London", "country": "CA"},
+    {"id": 2643736, "name": "Londonderry", "country": "GB"},
+    {"id": 3117735, "name": "Madrid", "country": "ES"},
+    {"id": 2657896, "name": "Zürich", "country": "CH"},
+    {"id": 1701668, "name": "Manila", "country": "PH"},
+    {"id": 1263780, "name": "Mankal", "country": "IN"},
+    {"id": 2988507, "name": "Paris", "country": "FR"},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "city_index.bin")
+    build(CITIES, path)
+    index = CityIndex(path)
+    yield index
+    index.close()
+
+
+def labels(suggestions):
+    return [s.label for s in suggestions]
+
+
+# resolve: exact names
+
+def test_resolve_unique_name_to_id(index):
+    assert index.resolve("Madrid") == 3117735
+
+
+def test_resolve_ignores_case_and_accents(index):
+    assert index.resolve("  zurich ") == 2657896
+
+
+def test_resolve_shared_name_unchanged(index):
+    assert index.resolve("London") == "London"
+
+
+def test_resolve_label_to_id(index):
+    assert index.resolve("London, OH, US") == 4517009
+    assert index.resolve("London, GB") == 2643743
+
+
+def test_resolve_unknown_label_is_left_alone(index):
+    assert index.resolve("London, FR") is None
+
+
+# resolve: prefixes are not typos
+
+def test_resolve_prefix_of_longer_name_is_not_corrected(index):
+    assert index.resolve("Lond") is None
+    assert index.resolve("Londonder") is None
+
+
+# resolve: misspellings
+
+def test_resolve_swapped_letters_to_unique_city(index):
+    assert index.resolve("Madird") == 3117735
+
+
+def test_resolve_dropped_letter_to_unique_city(index):
+    assert index.resolve("Zurch") == 2657896
+
+
+def test_resolve_misspelled_first_letter(index):
+    assert index.resolve("Baris") == 2988507
+
+
+def test_resolve_misspelling_of_shared_name_to_name(index):
+    assert index.resolve("Lodnon") == "London"
+
+
+# resolve: only corrected when certain
+
+def test_resolve_two_names_one_edit_away_is_not_corrected(index):
+    # Manila and Mankal are both one edit from "Manial"
+    assert index.resolve("Manial") is None
+
+
+def test_resolve_two_edits_away_is_not_corrected(index):
+    assert index.resolve("Madirb") is None
+
+
+def test_resolve_short_or_unknown_names(index):
+    assert index.resolve("Pa") is None
+    assert index.resolve("Qwzx") is None
+
+
+def test_resolve_gives_up_when_search_is_cut_short(index, monkeypatch):
+    monkeypatch.setattr(Config, "CITY_RESOLVE_BUDGET", 2)
+    assert index.resolve("Madird") is None
+
+
+def test_resolve_without_index(tmp_path):
+    assert CityIndex(str(tmp_path / "missing.bin")).resolve("Madrid") is None
+
+
+# suggest
+
+def test_suggest_prefix_matches_exact_name_first(index):
+    assert labels(index.suggest("lond")) == [
+        "London, GB", "London, OH, US", "London, CA", "Londonderry, GB",
+    ]
+
+
+def test_suggest_misspelling(index):
+    assert labels(index.suggest("madird")) == ["Madrid, ES"]
+
+
+def test_suggest_without_fuzzy_on_prefix_miss(index):
+    assert index.suggest("madird", fuzzy=False) == []
+
+
+def test_suggest_label_with_country(index):
+    assert labels(index.suggest("London, GB")) == ["London, GB"]
+    assert labels(index.suggest("london, u")) == ["London, OH, US"]
+    assert labels(index.suggest("Lodnon, CA")) == ["London, CA"]
@@ -0,0 +1,47 @@
+# test_forecast.py
+"""Tests for forecast bucket labels in the city's local time."""
+
+from array import array
+
+import pytest
+
+from forecast import Forecast
+
+
+def make_forecast(timezone, first, count=8):
+    times = array("q", (first + i * 10800 for i in range(count)))
+    return Forecast(
+        timezone, times, array("d", range(count)), ["10n"] * count, ["Rain"] * count,
+        array("d", [0.0] * count), array("d", [0.0] * count),
+    )
+
+
+# 2023-11-15 14:00 UTC, a slot of OWM's 3-hour UTC grid
+FIRST_SAMPLE = 1700056800
+
+
+@pytest.mark.parametrize("timezone, labels", [
+    (0, ["14:00", "17:00", "20:00"]),
+    (-4 * 3600, ["10:00", "13:00", "16:00"]),
+    (5 * 3600 + 1800, ["19:30", "22:30", "01:30"]),
+])
+def test_hourly_slots_labelled_at_sample_time(timezone, labels):
+    assert make_forecast(timezone, FIRST_SAMPLE).hourly(hours=3).labels[:3] == labels
+
+
+def test_hourly_slot_starts_are_sample_times():
+    forecast = make_forecast(-4 * 3600, FIRST_SAMPLE)
+    assert list(forecast.hourly(hours=6).starts[:2]) == [FIRST_SAMPLE, FIRST_SAMPLE + 6 * 3600]
+
+
+def test_wider_hourly_slots_group_consecutive_samples():
+    hourly = make_forecast(5 * 3600 + 1800, FIRST_SAMPLE).hourly(hours=6)
+    assert hourly.labels[:2] == ["19:30", "01:30"]
+    assert list(hourly.counts[:2]) == [2, 2]
+
+
+def test_daily_buckets_follow_local_calendar_day():
+    # 19:30, 22:30 on Wednesday, then Thursday from 01:30
+    daily = make_forecast(5 * 3600 + 1800, FIRST_SAMPLE).daily()
+    assert daily.labels[:2] == ["Wed", "Thu"]
+    assert daily.counts[0] == 2
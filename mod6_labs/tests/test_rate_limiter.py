@@ -0,0 +1,89 @@
+# test_rate_limiter.py
+"""Tests for RateLimiter lane ordering, promotion and cancellation."""
+
+import asyncio
+
+from rate_limiter import BACKGROUND, INTERACTIVE, RateLimiter
+
+
+def queue_and_serve(limiter, requests, before_serve=None):
+    """Queue (name, priority, key) requests behind an empty bucket; return service order."""
+    async def main():
+        await limiter.acquire()  # takes the only token
+        order = []
+
+        async def request(name, priority, key):
+            await limiter.acquire(priority, key)
+            order.append(name)
+
+        tasks = {name: asyncio.ensure_future(request(name, priority, key))
+                 for name, priority, key in requests}
+        await asyncio.sleep(0)  # all queued
+        if before_serve:
+            before_serve(tasks)
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return order
+
+    return asyncio.run(main())
+
+
+def test_immediate_while_tokens_last():
+    limiter = RateLimiter(rate_per_minute=60, burst=3)
+
+    async def main():
+        for _ in range(3):
+            await asyncio.wait_for(limiter.acquire(), 0.01)
+
+    asyncio.run(main())
+    assert limiter.stats()["lanes"]["interactive"]["waited"] == 0
+
+
+def test_interactive_served_before_background():
+    limiter = RateLimiter(rate_per_minute=6000, burst=1)
+    order = queue_and_serve(limiter, [
+        ("bg1", BACKGROUND, None),
+        ("bg2", BACKGROUND, None),
+        ("ui1", INTERACTIVE, None),
+        ("ui2", INTERACTIVE, None),
+    ])
+    assert order == ["ui1", "ui2", "bg1", "bg2"]
+
+
+def test_promote_moves_request_to_interactive_lane():
+    limiter = RateLimiter(rate_per_minute=6000, burst=1)
+    order = queue_and_serve(limiter, [
+        ("bg1", BACKGROUND, "a"),
+        ("bg2", BACKGROUND, "b"),
+    ], before_serve=lambda tasks: limiter.promote("b", INTERACTIVE))
+    assert order == ["bg2", "bg1"]
+    assert limiter.stats()["lanes"]["interactive"]["acquired"] == 2
+
+
+def test_cancelled_waiter_leaves_queue():
+    limiter = RateLimiter(rate_per_minute=6000, burst=1)
+
+    def cancel(tasks):
+        tasks["ui1"].cancel()
+
+    order = queue_and_serve(limiter, [
+        ("ui1", INTERACTIVE, None),
+        ("ui2", INTERACTIVE, None),
+        ("bg1", BACKGROUND, None),
+    ], before_serve=cancel)
+    assert order == ["ui2", "bg1"]
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_cancel_removes_waiter_immediately():
+    limiter = RateLimiter(rate_per_minute=60, burst=1)
+
+    async def main():
+        await limiter.acquire()
+        task = asyncio.ensure_future(limiter.acquire(BACKGROUND))
+        await asyncio.sleep(0)
+        assert limiter.stats()["queue_depth"] == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return len(limiter._waiters)
+
+    assert asyncio.run(main()) == 0
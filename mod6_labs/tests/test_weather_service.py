@@ -0,0 +1,209 @@
+# test_weather_service.py
+"""Tests for retries, the request deadline and the circuit breaker."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from config import Config
+from rate_limiter import BACKGROUND, INTERACTIVE
+from weather_service import CircuitBreaker, CircuitOpenError, WeatherService
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(Config, "RETRY_ATTEMPTS", 3)
+    monkeypatch.setattr(Config, "RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(Config, "BREAKER_FAILURE_THRESHOLD", 3)
+
+
+def make_service(handler, timeout=10):
+    service = WeatherService(transport=httpx.MockTransport(handler))
+    service.timeout = timeout
+    return service
+
+
+def run(service, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+# CircuitBreaker
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_half_open_allows_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    breaker.opened_at -= 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_breaker_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    breaker.opened_at -= 30
+    breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_breaker_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.opened_at -= 30
+    breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_released_probe_can_be_retaken():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    breaker.opened_at -= 30
+    breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+# WeatherService._get
+
+def test_get_retries_server_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={})
+
+    service = make_service(handler)
+    response = run(service, service._get(Config.BASE_URL, {}))
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_get_returns_client_errors_without_retry():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(404)
+
+    service = make_service(handler)
+    response = run(service, service._get(Config.BASE_URL, {}))
+    assert response.status_code == 404
+    assert len(calls) == 1
+    assert service.breaker.failures == 0
+
+
+def test_get_single_attempt_without_retry():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    service = make_service(handler)
+    response = run(service, service._get(Config.BASE_URL, {}, retry=False))
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+def test_get_stops_when_backoff_passes_deadline():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503, headers={"Retry-After": "2"})
+
+    service = make_service(handler, timeout=1)
+    response = run(service, service._get(Config.BASE_URL, {}))
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+def test_get_attempts_share_one_timeout_budget():
+    read_timeouts = []
+
+    def handler(request):
+        read_timeouts.append(request.extensions["timeout"]["read"])
+        return httpx.Response(503, headers={"Retry-After": "0"})
+
+    service = make_service(handler, timeout=5)
+    run(service, service._get(Config.BASE_URL, {}))
+    assert len(read_timeouts) == 3
+    assert read_timeouts[0] <= 5
+    assert read_timeouts[0] >= read_timeouts[1] >= read_timeouts[2]
+
+
+def test_interactive_read_timeout_is_final():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    service = make_service(handler)
+    with pytest.raises(httpx.ReadTimeout):
+        run(service, service._get(Config.BASE_URL, {}, INTERACTIVE))
+    assert len(calls) == 1
+
+
+def test_background_read_timeout_is_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    service = make_service(handler)
+    with pytest.raises(httpx.ReadTimeout):
+        run(service, service._get(Config.BASE_URL, {}, BACKGROUND))
+    assert len(calls) == 3
+
+
+def test_get_stops_retrying_once_breaker_opens(monkeypatch):
+    monkeypatch.setattr(Config, "BREAKER_FAILURE_THRESHOLD", 2)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    service = make_service(handler)
+
+    async def main():
+        response = await service._get(Config.BASE_URL, {})
+        assert response.status_code == 500
+        with pytest.raises(CircuitOpenError):
+            await service._get(Config.BASE_URL, {})
+
+    run(service, main())
+    assert len(calls) == 2
+    assert service.circuit_open
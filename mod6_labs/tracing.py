@@ -0,0 +1,274 @@
+# tracing.py
+"""Lightweight span tracing of a search, from click to last page.update()."""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import time
+from collections import deque
+from typing import Any, Awaitable, Dict, Iterator, List, Optional
+from config import Config
+from metrics import registry
+
+WATERFALL_WIDTH = 40  # characters for the full trace in the debug waterfall
+
+# Innermost open span of the running task. asyncio copies the context into
+# every task it creates, so work spawned during a search joins its trace.
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    """One timed stage of a trace."""
+
+    __slots__ = ("name", "trace", "index", "parent", "depth", "start", "end", "attrs", "status")
+
+    def __init__(self, name: str, trace: "Trace", parent: Optional["Span"], attrs: Dict):
+        self.name = name
+        self.trace = trace
+        self.index = len(trace.spans)
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.status = "ok"
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self) -> Dict:
+        origin = self.trace.started
+        return {
+            "name": self.name,
+            "parent": self.parent.index if self.parent else None,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2),
+            "status": self.status,
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+
+
+class Trace:
+    """
+    All spans recorded for one search.
+
+    A trace is complete once its root stage (get_weather) has returned and
+    every span opened under it, including background AI work, has closed.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, attrs: Dict):
+        self.id = next(self._ids)
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.updates = 0  # page.update() round trips
+        self.root_done = False
+        self.exported = False
+        self._open = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.root_done and self._open == 0
+
+    @property
+    def duration(self) -> float:
+        return max((span.end or span.start for span in self.spans), default=self.started) - self.started
+
+    def stages(self) -> Dict[str, float]:
+        """Total seconds per span name."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "duration_ms": round(self.duration * 1000, 2),
+            "page_updates": self.updates,
+            "stages_ms": {name: round(s * 1000, 2) for name, s in self.stages().items()},
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+    def waterfall(self) -> str:
+        """Multi-line text chart of the spans against time."""
+        total = self.duration or 1e-9
+        label = ", ".join(f"{key}={value}" for key, value in self.attrs.items())
+        lines = [
+            f"Trace #{self.id} {self.name} ({label}): "
+            f"{self.duration * 1000:.1f} ms, {self.updates} page.update round trips"
+        ]
+        for span in self.spans:
+            offset = span.start - self.started
+            left = int(offset / total * WATERFALL_WIDTH)
+            width = max(1, round(span.duration / total * WATERFALL_WIDTH))
+            bar = " " * left + "#" * min(width, WATERFALL_WIDTH - left)
+            status = "" if span.status == "ok" else f" [{span.status}]"
+            name = "  " * span.depth + span.name
+            lines.append(
+                f"{offset * 1000:8.1f} {span.duration * 1000:8.1f} ms  "
+                f"{name:<32} |{bar:<{WATERFALL_WIDTH}}|{status}"
+            )
+        return "\n".join(lines)
+
+
+class Tracer:
+    """
+    Records traces of searches and exports the completed ones.
+
+    Completed traces are kept in memory (the most recent Config.TRACE_KEEP),
+    their stage durations go to the metrics registry as "trace.<stage>"
+    histograms, and each is appended as one JSON line to Config.TRACE_PATH
+    when that is set. With Config.DEBUG a waterfall is printed per trace.
+    """
+
+    def __init__(self):
+        self.traces: deque = deque(maxlen=Config.TRACE_KEEP)
+
+    @staticmethod
+    def current() -> Optional[Trace]:
+        span = _current.get()
+        return span.trace if span else None
+
+    @contextlib.contextmanager
+    def trace(self, name: str, **attrs) -> Iterator[Span]:
+        """
+        Begin a new trace whose first span is `name`.
+
+        Tasks started inside the block (e.g. with page.run_task) belong to
+        the trace. The trace does not complete when the block exits; its
+        root is the first span later opened with root=True.
+        """
+        trace = Trace(name, attrs)
+        span = self._open(name, trace, None, {})
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+            self._close(span)
+
+    @contextlib.contextmanager
+    def span(self, name: str, root: bool = False, **attrs) -> Iterator[Optional[Span]]:
+        """
+        Time a stage of the current trace.
+
+        Does nothing outside a trace, except that a root stage starts a new
+        trace of its own (so a get_weather not started by a search is still
+        traced). When a root span closes, the trace may complete.
+        """
+        parent = _current.get()
+        if parent is not None and parent.trace.exported:
+            parent = None  # late work of a finished trace is not recorded
+        if parent is None:
+            if not root:
+                yield None
+                return
+            trace = Trace(name, attrs)
+        else:
+            trace = parent.trace
+
+        span = self._open(name, trace, parent, attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+            raise
+        finally:
+            _current.reset(token)
+            if root:
+                trace.root_done = True
+            self._close(span)
+
+    def begin(self, name: str, **attrs) -> Optional[Span]:
+        """
+        Open a span of the current trace without making it the parent of
+        later spans, for a stretch of code that is not one block. Close it
+        with end(). Returns None outside a trace.
+        """
+        parent = _current.get()
+        if parent is None or parent.trace.exported:
+            return None
+        return self._open(name, parent.trace, parent, attrs)
+
+    def end(self, span: Optional[Span]):
+        """Close a span opened with begin()."""
+        if span is not None:
+            self._close(span)
+
+    def traced(self, name: str, root: bool = False):
+        """Decorator: run a coroutine function inside span(name)."""
+        def decorate(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(name, root=root):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    async def run(self, name: str, awaitable: Awaitable, **attrs) -> Any:
+        """Await `awaitable` inside span(name), e.g. one of several gathered fetches."""
+        with self.span(name, **attrs):
+            return await awaitable
+
+    def instrument(self, page):
+        """
+        Record every page.update() (and control.update(), which calls it)
+        made inside a trace as a span, and count the round trips.
+        """
+        update = page.update
+
+        def traced_update(*controls):
+            span = _current.get()
+            if span is None or span.trace.exported:
+                return update(*controls)
+            with self.span("page.update", controls=len(controls) or 1) as span:
+                span.trace.updates += 1
+                return update(*controls)
+
+        page.update = traced_update
+
+    def _open(self, name: str, trace: Trace, parent: Optional[Span], attrs: Dict) -> Span:
+        span = Span(name, trace, parent, attrs)
+        trace.spans.append(span)
+        trace._open += 1
+        return span
+
+    def _close(self, span: Span):
+        span.end = time.perf_counter()
+        trace = span.trace
+        trace._open -= 1
+        if trace.complete:
+            self._export(trace)
+
+    def _export(self, trace: Trace):
+        trace.exported = True
+        self.traces.append(trace)
+        for name, seconds in trace.stages().items():
+            registry.histogram(f"trace.{name}").observe(seconds)
+        registry.counter("trace.page_updates").inc(trace.updates)
+
+        if Config.DEBUG:
+            for line in trace.waterfall().splitlines():
+                print(f"DEBUG: {line}")
+
+        if Config.TRACE_PATH:
+            try:
+                with open(Config.TRACE_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_dict()) + "\n")
+            except OSError as e:
+                print(f"DEBUG: Could not write trace: {str(e)}")
+
+
+# Process-wide tracer
+tracer = Tracer()
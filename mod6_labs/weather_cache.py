@@ -0,0 +1,374 @@
+# weather_cache.py
+"""Persistent weather cache (in-memory LRU tier backed by SQLite)."""
+
+import datetime
+import json
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+import geohash
+from config import Config
+
+
+class WeatherCache:
+    """
+    Two-tier cache for weather and forecast payloads.
+
+    Each place has one canonical entry, keyed by its OpenWeatherMap city
+    ID ("id:2643743"), that holds the raw API payloads plus the time they
+    were fetched. Lookups resolve to that entry in three ways:
+
+    - by the query the user typed (lower-cased city name, as in
+      WeatherApp.get_weather), stored as a persistent alias;
+    - by the name OWM returned for the place;
+    - by coordinates, through a geohash index of each entry's `coord`,
+      so nearby points (e.g. GPS jitter) hit the same record.
+
+    The most recently used entries are kept in memory; every entry is
+    also written to SQLite so the cache survives restarts. Both tiers are
+    capped at max_entries and evict least recently used entries first.
+
+    Cache hits only reorder the memory tier; their access times reach
+    SQLite in one batch on flush() (or close()), so a hit never waits on
+    the disk. Writes touch only their own rows: eviction runs only once
+    the cap is exceeded and deletes just the evicted keys.
+
+    The last location detected for the user is kept alongside, so startup
+    can show it before IP geolocation answers.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.path = path or Config.CACHE_PATH
+        self.max_entries = max_entries or Config.CACHE_MAX_ENTRIES
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}      # query or name -> canonical key
+        self._cells: Dict[str, List[str]] = {}  # geohash cell -> canonical keys
+        self._last_location: Optional[Dict] = None
+        self._accessed: Dict[str, float] = {}  # key -> last_access not yet written
+        self._db: Optional[sqlite3.Connection] = None
+
+        try:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS weather_cache (
+                    key TEXT PRIMARY KEY,
+                    weather TEXT NOT NULL,
+                    forecast TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_aliases (
+                    alias TEXT PRIMARY KEY,
+                    key TEXT NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS app_state (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+            self._db.commit()
+            self._warm()
+        except sqlite3.Error as e:
+            # Keep working as a memory-only cache
+            print(f"DEBUG: Weather cache disabled on disk: {str(e)}")
+            self._db = None
+
+    def _warm(self):
+        """Load the most recently used entries and their aliases into memory."""
+        rows = self._db.execute(
+            "SELECT key, weather, forecast, fetched_at FROM weather_cache "
+            "ORDER BY last_access DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+
+        # Oldest first, so the newest ends up at the MRU end
+        for key, weather, forecast, fetched_at in reversed(rows):
+            entry = self._row_to_entry(weather, forecast, fetched_at)
+            self._memory[key] = entry
+            self._index(key, entry["weather"])
+
+        for alias, key in self._db.execute("SELECT alias, key FROM cache_aliases"):
+            if key in self._memory:
+                self._aliases[alias] = key
+
+        row = self._db.execute(
+            "SELECT value FROM app_state WHERE name = 'last_location'"
+        ).fetchone()
+        if row:
+            self._last_location = json.loads(row[0])
+
+        # Rows left behind by a larger cap; from here on both tiers hold the same keys
+        self._db.execute(
+            "DELETE FROM weather_cache WHERE key NOT IN ("
+            "SELECT key FROM weather_cache ORDER BY last_access DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._db.execute("DELETE FROM cache_aliases WHERE key NOT IN (SELECT key FROM weather_cache)")
+        self._db.commit()
+
+    @staticmethod
+    def _row_to_entry(weather: str, forecast: Optional[str], fetched_at: float) -> Dict:
+        return {
+            "weather": json.loads(weather),
+            "forecast": json.loads(forecast) if forecast else None,
+            "timestamp": datetime.datetime.fromtimestamp(fetched_at),
+        }
+
+    @staticmethod
+    def query_key(city: Union[str, int]) -> str:
+        """Cache key for a lookup by city name or OWM city ID."""
+        if isinstance(city, int):
+            return f"id:{city}"
+        return city.strip().lower()
+
+    @staticmethod
+    def canonical_key(weather: Dict) -> Optional[str]:
+        """Canonical key for a weather payload (its OWM city ID)."""
+        if weather.get("id"):
+            return f"id:{weather['id']}"
+        name = weather.get("name")
+        return name.strip().lower() if name else None
+
+    def _resolve(self, key: str) -> str:
+        return self._aliases.get(key, key)
+
+    def _index(self, key: str, weather: Dict):
+        """Add an entry's OWM name and coordinate cell to the in-memory index."""
+        name = weather.get("name")
+        if name:
+            self._aliases.setdefault(name.strip().lower(), key)
+
+        coord = weather.get("coord")
+        if coord and "lat" in coord and "lon" in coord:
+            cell = geohash.encode(coord["lat"], coord["lon"], Config.GEOHASH_PRECISION)
+            keys = self._cells.setdefault(cell, [])
+            if key not in keys:
+                keys.append(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self._resolve(key) in self._memory
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cache entry.
+
+        Args:
+            key: Cache key (see query_key), an OWM name, or a canonical key
+
+        Returns:
+            Dict with 'weather', 'forecast' and 'timestamp', or None
+        """
+        key = self._resolve(key)
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+
+        self._memory.move_to_end(key)
+        self._accessed[key] = datetime.datetime.now().timestamp()
+        return entry
+
+    def peek(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cache entry without counting it as a use.
+
+        Unlike get(), the entry keeps its LRU position and access time, so
+        background readers do not keep entries alive.
+
+        Args:
+            key: Cache key (see query_key), an OWM name, or a canonical key
+
+        Returns:
+            Dict with 'weather', 'forecast' and 'timestamp', or None
+        """
+        return self._memory.get(self._resolve(key))
+
+    def find_near(self, lat: float, lon: float) -> Optional[str]:
+        """
+        Find the cached place closest to a coordinate pair.
+
+        Searches the point's geohash cell and its neighbours and accepts
+        the nearest entry within Config.GEO_MATCH_RADIUS_KM.
+
+        Args:
+            lat: Latitude
+            lon: Longitude
+
+        Returns:
+            Canonical cache key, or None if nothing is close enough
+        """
+        best_key = None
+        best_distance = Config.GEO_MATCH_RADIUS_KM
+        for cell in geohash.neighborhood(lat, lon, Config.GEOHASH_PRECISION):
+            for key in self._cells.get(cell, []):
+                coord = self._memory[key]["weather"]["coord"]
+                distance = geohash.distance_km(lat, lon, coord["lat"], coord["lon"])
+                if distance <= best_distance:
+                    best_key, best_distance = key, distance
+        return best_key
+
+    def put(
+        self,
+        key: Optional[str],
+        weather: Dict,
+        forecast: Optional[Dict],
+        timestamp: Optional[datetime.datetime] = None,
+    ) -> str:
+        """
+        Store weather and forecast payloads.
+
+        The entry is stored under the payload's canonical key; `key` (the
+        query that produced it, if any) becomes an alias for it.
+
+        Args:
+            key: Query cache key (see query_key), or None for coordinate lookups
+            weather: Current weather payload
+            forecast: Forecast payload (may be None)
+            timestamp: When the data was fetched (defaults to now)
+
+        Returns:
+            The canonical key the entry was stored under
+
+        Raises:
+            ValueError: If the payload has no ID or name and no key is given
+        """
+        canonical = self.canonical_key(weather) or key
+        if not canonical:
+            raise ValueError("Cannot cache weather without a city ID, name or query key")
+        timestamp = timestamp or datetime.datetime.now()
+        self._accessed.pop(canonical, None)  # superseded by the row written below
+
+        # Drop the old copy's position in the coordinate index
+        if canonical in self._memory:
+            self._unindex(canonical)
+
+        self._memory[canonical] = {
+            "weather": weather,
+            "forecast": forecast,
+            "timestamp": timestamp,
+        }
+        self._memory.move_to_end(canonical)
+        self._index(canonical, weather)
+
+        fetched_at = timestamp.timestamp()
+        self._execute(
+            "INSERT OR REPLACE INTO weather_cache "
+            "(key, weather, forecast, fetched_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (
+                canonical,
+                json.dumps(weather),
+                json.dumps(forecast) if forecast is not None else None,
+                fetched_at,
+                datetime.datetime.now().timestamp(),
+            ),
+        )
+
+        if key and key != canonical:
+            self._aliases[key] = canonical
+            self._execute(
+                "INSERT OR REPLACE INTO cache_aliases (alias, key) VALUES (?, ?)",
+                (key, canonical),
+            )
+
+        if len(self._memory) > self.max_entries:
+            self._evict()
+        return canonical
+
+    def get_last_location(self) -> Optional[Dict]:
+        """
+        The last location detected by IP geolocation.
+
+        Returns:
+            Dict with 'city', 'lat' and 'lon' (coordinates may be None),
+            or None if no location was ever detected
+        """
+        return self._last_location
+
+    def set_last_location(self, city: str, lat: Optional[float], lon: Optional[float]):
+        """
+        Remember the user's detected location across restarts.
+
+        Args:
+            city: City name reported by the geolocation service
+            lat: Latitude (None if unknown)
+            lon: Longitude (None if unknown)
+        """
+        self._last_location = {"city": city, "lat": lat, "lon": lon}
+        self._execute(
+            "INSERT OR REPLACE INTO app_state (name, value) VALUES ('last_location', ?)",
+            (json.dumps(self._last_location),),
+        )
+
+    def _unindex(self, key: str):
+        """Remove an entry from the coordinate index."""
+        for cell in [c for c, keys in self._cells.items() if key in keys]:
+            self._cells[cell].remove(key)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries."""
+        evicted = []
+        while len(self._memory) > self.max_entries:
+            key, _ = self._memory.popitem(last=False)
+            self._unindex(key)
+            self._accessed.pop(key, None)
+            evicted.append(key)
+
+        if not evicted:
+            return
+        self._aliases = {
+            alias: key for alias, key in self._aliases.items()
+            if key in self._memory
+        }
+
+        # The memory tier holds every row on disk, so its victims are the disk's too
+        placeholders = ", ".join("?" * len(evicted))
+        self._execute(f"DELETE FROM cache_aliases WHERE key IN ({placeholders})", tuple(evicted))
+        self._execute(f"DELETE FROM weather_cache WHERE key IN ({placeholders})", tuple(evicted))
+
+    def _execute(self, sql: str, params: tuple = ()):
+        """Run a write statement, ignoring disk errors."""
+        if self._db is None:
+            return
+        try:
+            self._db.execute(sql, params)
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"DEBUG: Weather cache write failed: {str(e)}")
+
+    def flush(self):
+        """Write pending access times to SQLite in one transaction."""
+        if not self._accessed or self._db is None:
+            self._accessed.clear()
+            return
+        rows = [(last_access, key) for key, last_access in self._accessed.items()]
+        self._accessed.clear()
+        try:
+            self._db.executemany("UPDATE weather_cache SET last_access = ? WHERE key = ?", rows)
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"DEBUG: Weather cache write failed: {str(e)}")
+
+    def close(self):
+        """Write pending access times and close the database connection."""
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
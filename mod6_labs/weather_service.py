@@ -1,9 +1,27 @@
 # weather_service.py
 """Weather API service layer."""
 
-import httpx
-from typing import Dict, Optional
+import asyncio
+import contextvars
+import random
+import time
+from typing import (
+    AsyncIterator, Awaitable, Callable, Dict, Iterable, List, NamedTuple,
+    Optional, Tuple, Union,
+)
 from config import Config
+from rate_limiter import BACKGROUND, INTERACTIVE, RateLimiter
+from startup import lazy_import
+
+# Loaded on first use (see WeatherService.start), not at import
+httpx = lazy_import("httpx")
+
+# A city is looked up by name ("London") or by OpenWeatherMap city ID (2643743)
+CityRef = Union[str, int]
+
+# Single-flight key of the shared request the running task performs, so
+# _get can follow a priority raised by a caller that joined it
+_request_key: contextvars.ContextVar[Optional[Tuple]] = contextvars.ContextVar("request_key", default=None)
 
 
 class WeatherServiceError(Exception):
@@ -11,20 +29,339 @@ class WeatherServiceError(Exception):
     pass
 
 
+class CircuitOpenError(WeatherServiceError):
+    """Raised without contacting the API while the circuit breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    
+    closed:    requests go through; failures are counted.
+    open:      after `failure_threshold` consecutive failures, requests
+               fail immediately for `reset_timeout` seconds.
+    half_open: after the timeout one probe request is let through; success
+               closes the circuit, failure opens it again.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        """Current breaker state."""
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+    
+    def allow_request(self) -> bool:
+        """Whether a request may be sent now."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+    
+    def release_probe(self):
+        """Give up a half-open probe slot without recording an outcome."""
+        self._probing = False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class BulkResult(NamedTuple):
+    """One city's outcome from a bulk fetch."""
+    city: CityRef
+    data: Optional[Dict]
+    error: Optional[WeatherServiceError]
+
+
+class _Flight:
+    """A request shared by concurrent identical lookups (see WeatherService._coalesce)."""
+    
+    __slots__ = ("future", "waiters", "priority")
+    
+    def __init__(self, future: asyncio.Future, priority: int):
+        self.future = future
+        self.waiters = 0  # callers currently awaiting the result
+        self.priority = priority  # most urgent lane of any caller
+
+
 class WeatherService:
     """Service for fetching weather data from OpenWeatherMap API."""
     
-    def __init__(self):
+    def __init__(self, transport: Optional["httpx.AsyncBaseTransport"] = None):
         self.api_key = Config.API_KEY
         self.base_url = Config.BASE_URL
         self.timeout = Config.TIMEOUT
+        
+        # Shared, pooled client (created lazily by start()). A custom
+        # transport (e.g. httpx.MockTransport) replaces the network.
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._transport = transport
+        
+        # In-flight requests, shared by identical concurrent lookups
+        self._inflight: Dict[Tuple, _Flight] = {}
+        
+        # Shared call budget for the OWM per-minute quota
+        self.rate_limiter = RateLimiter(Config.RATE_LIMIT_PER_MINUTE, Config.RATE_LIMIT_BURST)
+        
+        # Fails fast while OpenWeatherMap is down
+        self.breaker = CircuitBreaker(
+            Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_TIMEOUT
+        )
+    
+    async def start(self) -> "httpx.AsyncClient":
+        """
+        Open the shared HTTP client if it is not already open.
+        
+        Every request goes through this one client, so TCP/TLS
+        connections are kept alive and reused between lookups.
+        Safe to call more than once.
+        
+        Returns:
+            The shared httpx.AsyncClient
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=Config.CONNECT_TIMEOUT),
+                http2=self._http2_available(),
+                transport=self._transport,
+                limits=httpx.Limits(
+                    max_connections=Config.MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=Config.KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the shared HTTP client and release its connections."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+    
+    def _http2_available(self) -> bool:
+        """Check whether HTTP/2 is enabled and the 'h2' package is installed."""
+        if not Config.HTTP2:
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("WARNING: HTTP2 enabled but 'h2' is not installed. Using HTTP/1.1.")
+            return False
+        return True
+    
+    @property
+    def circuit_open(self) -> bool:
+        """True while requests are being short-circuited."""
+        return self.breaker.state == CircuitBreaker.OPEN
+    
+    @staticmethod
+    def _is_transient(response: "httpx.Response") -> bool:
+        """Server-side or rate-limit responses worth retrying."""
+        return response.status_code >= 500 or response.status_code == 429
+    
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional["httpx.Response"] = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when given."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), Config.RETRY_MAX_DELAY)
+        backoff = min(Config.RETRY_MAX_DELAY, Config.RETRY_BASE_DELAY * 2 ** attempt)
+        return random.uniform(0, backoff)
+    
+    async def _get(
+        self,
+        url: str,
+        params: Dict,
+        priority: int = INTERACTIVE,
+        retry: bool = True,
+    ) -> "httpx.Response":
+        """
+        GET with rate limiting, retries and circuit breaking.
+        
+        Every attempt (including retries) takes a token from the shared
+        rate limiter in the given priority lane.
+        
+        Timeouts, transport errors, 5xx and 429 responses are retried up to
+        Config.RETRY_ATTEMPTS times with jittered exponential backoff, but
+        all attempts and backoff share one Config.TIMEOUT budget, counted
+        from the first send. A read timeout has used that budget up; it is
+        not retried in the INTERACTIVE lane either way. Other responses
+        (including 4xx) are returned as-is for the caller to interpret.
+        
+        Every failed attempt counts towards the circuit breaker, and no
+        retry is made once it opens.
+        
+        Args:
+            url: Endpoint URL
+            params: Query parameters
+            priority: Rate-limiter lane (INTERACTIVE or BACKGROUND)
+            retry: False makes a single attempt (a caller with a fallback
+                at hand would rather use it than wait)
+        
+        Raises:
+            CircuitOpenError: If the breaker is open
+            httpx.TransportError: If the last attempt failed at transport level
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(
+                "Weather service is unreachable. Showing saved data if available."
+            )
+        
+        client = await self.start()
+        loop = asyncio.get_running_loop()
+        deadline = None
+        attempts = Config.RETRY_ATTEMPTS if retry else 1
+        key = _request_key.get()
+        for attempt in range(attempts):
+            flight = self._inflight.get(key)
+            if flight is not None:
+                priority = min(priority, flight.priority)
+            try:
+                await self.rate_limiter.acquire(priority, key)
+                if deadline is None:
+                    deadline = loop.time() + self.timeout
+                remaining = max(deadline - loop.time(), 0.001)
+                response = await client.get(url, params=params, timeout=httpx.Timeout(
+                    remaining, connect=min(Config.CONNECT_TIMEOUT, remaining)
+                ))
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                delay = self._retry_delay(attempt)
+                final = isinstance(e, httpx.ReadTimeout) and priority == INTERACTIVE
+                if final or not self._may_retry(attempt, attempts, deadline, delay):
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled, not a sign of an outage
+                self.breaker.release_probe()
+                raise
+            
+            if not self._is_transient(response):
+                self.breaker.record_success()
+                return response
+            self.breaker.record_failure()
+            delay = self._retry_delay(attempt, response)
+            if not self._may_retry(attempt, attempts, deadline, delay):
+                return response
+            await asyncio.sleep(delay)
+    
+    def _may_retry(self, attempt: int, attempts: int, deadline: float, delay: float) -> bool:
+        """Whether another attempt fits after `delay` seconds of backoff."""
+        if attempt + 1 >= attempts or self.breaker.state != CircuitBreaker.CLOSED:
+            return False
+        return asyncio.get_running_loop().time() + delay < deadline
+    
+    @staticmethod
+    def _city_key(endpoint: str, city: CityRef) -> Tuple:
+        """Normalized single-flight key for a city lookup."""
+        if isinstance(city, int):
+            return (endpoint, city, Config.UNITS)
+        return (endpoint, " ".join(city.split()).lower(), Config.UNITS)
+    
+    @staticmethod
+    def _city_params(city: CityRef) -> Dict:
+        """Query parameter selecting a city by ID or by name."""
+        if isinstance(city, int):
+            return {"id": city}
+        return {"q": city}
+    
+    @staticmethod
+    def _coords_key(endpoint: str, lat: float, lon: float) -> Tuple:
+        """Normalized single-flight key for a coordinate lookup."""
+        precision = Config.COORD_PRECISION
+        return (endpoint, round(lat, precision), round(lon, precision), Config.UNITS)
+    
+    async def _coalesce(
+        self,
+        key: Tuple,
+        priority: int,
+        fetch: Callable[..., Awaitable[Dict]],
+        *args,
+    ) -> Dict:
+        """
+        Run fetch(*args) once for all concurrent callers with the same key.
+        
+        The first caller starts the request; anyone asking for the same key
+        while it is still running awaits the same future and gets the same
+        result (or exception). The entry is dropped once the request ends,
+        so later calls always go to the network again.
+        
+        A caller in a more urgent lane than the request's (an interactive
+        search joining a background refresh) raises the request to its
+        lane, including any rate-limiter wait it is in.
+        
+        A cancelled caller leaves the request running for the others; when
+        the last one leaves, the request itself is cancelled, so work nobody
+        waits for does not keep using the API quota.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            token = _request_key.set(key)
+            try:
+                flight = _Flight(asyncio.ensure_future(fetch(*args)), priority)
+            finally:
+                _request_key.reset(token)
+            self._inflight[key] = flight
+            
+            def _done(f, key=key, flight=flight):
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                # Mark the exception as retrieved if every waiter was cancelled
+                if not f.cancelled():
+                    f.exception()
+            
+            flight.future.add_done_callback(_done)
+        elif priority < flight.priority:
+            flight.priority = priority
+            self.rate_limiter.promote(key, priority)
+        
+        flight.waiters += 1
+        try:
+            # Shield so one cancelled caller does not cancel the shared request
+            return await asyncio.shield(flight.future)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.future.done():
+                # Nobody is left to use the result; later callers start afresh
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                flight.future.cancel()
     
-    async def get_weather(self, city: str) -> Dict:
+    async def get_weather(self, city: CityRef, priority: int = INTERACTIVE, retry: bool = True) -> Dict:
         """
         Fetch weather data for a given city.
         
         Args:
-            city: Name of the city
+            city: Name of the city, or its OpenWeatherMap city ID
+            priority: Rate-limiter lane (INTERACTIVE or BACKGROUND)
+            retry: False gives up after the first failed attempt
             
         Returns:
             Dictionary containing weather data
@@ -35,41 +372,48 @@ class WeatherService:
         if not city:
             raise WeatherServiceError("City name cannot be empty")
         
+        return await self._coalesce(
+            self._city_key("weather", city), priority, self._fetch_weather, city, priority, retry
+        )
+    
+    async def _fetch_weather(self, city: CityRef, priority: int, retry: bool = True) -> Dict:
+        """Request current weather for a city from the API."""
         # Build request parameters
         params = {
-            "q": city,
+            **self._city_params(city),
             "appid": self.api_key,
             "units": Config.UNITS,
         }
         
         try:
-            # Make async HTTP request
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(self.base_url, params=params)
-                
-                # Check for HTTP errors
-                if response.status_code == 404:
-                    raise WeatherServiceError(
-                        f"City '{city}' not found. Please check the spelling."
-                    )
-                elif response.status_code == 401:
-                    raise WeatherServiceError(
-                        "Invalid API key. Please check your configuration."
-                    )
-                elif response.status_code >= 500:
-                    raise WeatherServiceError(
-                        "Weather service is currently unavailable. "
-                        "Please try again later."
-                    )
-                elif response.status_code != 200:
-                    raise WeatherServiceError(
-                        f"Error fetching weather data: {response.status_code}"
-                    )
-                
-                # Parse JSON response
-                data = response.json()
-                return data
-                
+            # Make async HTTP request on the shared client
+            response = await self._get(self.base_url, params, priority, retry)
+            
+            # Check for HTTP errors
+            if response.status_code == 404:
+                raise WeatherServiceError(
+                    f"City '{city}' not found. Please check the spelling."
+                )
+            elif response.status_code == 401:
+                raise WeatherServiceError(
+                    "Invalid API key. Please check your configuration."
+                )
+            elif response.status_code >= 500:
+                raise WeatherServiceError(
+                    "Weather service is currently unavailable. "
+                    "Please try again later."
+                )
+            elif response.status_code != 200:
+                raise WeatherServiceError(
+                    f"Error fetching weather data: {response.status_code}"
+                )
+            
+            # Parse JSON response
+            data = response.json()
+            return data
+            
+        except WeatherServiceError:
+            raise
         except httpx.TimeoutException:
             raise WeatherServiceError(
                 "Request timed out. Please check your internet connection."
@@ -83,24 +427,30 @@ class WeatherService:
         except Exception as e:
             raise WeatherServiceError(f"An unexpected error occurred: {str(e)}")
     
-    async def get_forecast(self, city: str) -> Dict:
+    async def get_forecast(self, city: CityRef, priority: int = INTERACTIVE, retry: bool = True) -> Dict:
         """Get 5-day weather forecast."""
+        return await self._coalesce(
+            self._city_key("forecast", city), priority, self._fetch_forecast, city, priority, retry
+        )
+    
+    async def _fetch_forecast(self, city: CityRef, priority: int, retry: bool = True) -> Dict:
+        """Request the 5-day forecast for a city from the API."""
         forecast_url = "https://api.openweathermap.org/data/2.5/forecast"
         params = {
-            "q": city,
+            **self._city_params(city),
             "appid": self.api_key,
             "units": Config.UNITS,
         }
         
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(forecast_url, params=params)
-            response.raise_for_status()
-            return response.json()
+        response = await self._get(forecast_url, params, priority, retry)
+        response.raise_for_status()
+        return response.json()
 
     async def get_weather_by_coordinates(
         self, 
         lat: float, 
-        lon: float
+        lon: float,
+        priority: int = INTERACTIVE,
     ) -> Dict:
         """
         Fetch weather data by coordinates.
@@ -108,10 +458,18 @@ class WeatherService:
         Args:
             lat: Latitude
             lon: Longitude
+            priority: Rate-limiter lane (INTERACTIVE or BACKGROUND)
             
         Returns:
             Dictionary containing weather data
         """
+        return await self._coalesce(
+            self._coords_key("weather", lat, lon), priority,
+            self._fetch_weather_by_coordinates, lat, lon, priority,
+        )
+    
+    async def _fetch_weather_by_coordinates(self, lat: float, lon: float, priority: int) -> Dict:
+        """Request current weather for a coordinate pair from the API."""
         params = {
             "lat": lat,
             "lon": lon,
@@ -120,10 +478,190 @@ class WeatherService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(self.base_url, params=params)
-                response.raise_for_status()
-                return response.json()
-                
+            response = await self._get(self.base_url, params, priority)
+            response.raise_for_status()
+            return response.json()
+            
+        except WeatherServiceError:
+            raise
         except Exception as e:
-            raise WeatherServiceError(f"Error fetching weather data: {str(e)}")
\ No newline at end of file
+            raise WeatherServiceError(f"Error fetching weather data: {str(e)}")
+    
+    async def get_forecast_by_coordinates(
+        self,
+        lat: float,
+        lon: float,
+        priority: int = INTERACTIVE,
+    ) -> Dict:
+        """Get 5-day weather forecast by coordinates."""
+        return await self._coalesce(
+            self._coords_key("forecast", lat, lon), priority,
+            self._fetch_forecast_by_coordinates, lat, lon, priority,
+        )
+    
+    async def _fetch_forecast_by_coordinates(self, lat: float, lon: float, priority: int) -> Dict:
+        """Request the 5-day forecast for a coordinate pair from the API."""
+        forecast_url = "https://api.openweathermap.org/data/2.5/forecast"
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self.api_key,
+            "units": Config.UNITS,
+        }
+        
+        response = await self._get(forecast_url, params, priority)
+        response.raise_for_status()
+        return response.json()
+    
+    async def get_current_location(self) -> Dict:
+        """
+        Look up the user's approximate location from their IP address.
+        
+        Gives up after Config.IPAPI_TIMEOUT seconds, so a slow lookup
+        cannot hold up startup.
+        
+        Returns:
+            ipapi.co payload ('city', 'latitude', 'longitude', ...)
+        
+        Raises:
+            httpx.HTTPError: If the lookup fails or times out
+        """
+        client = await self.start()
+        response = await client.get(Config.IPAPI_URL, timeout=Config.IPAPI_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+    
+    async def get_weather_many(
+        self,
+        cities: Iterable[CityRef],
+        concurrency: Optional[int] = None,
+        priority: int = BACKGROUND,
+    ) -> AsyncIterator[BulkResult]:
+        """
+        Fetch current weather for many cities.
+        
+        City IDs are batched through the OWM group endpoint (up to
+        Config.GROUP_MAX_IDS per request); names are fetched one by one.
+        At most `concurrency` requests run at once. Results are yielded
+        as they complete, and a failing city yields a BulkResult with
+        `error` set instead of stopping the whole batch.
+        
+        Args:
+            cities: City names and/or OpenWeatherMap city IDs
+            concurrency: Max parallel requests (default Config.BULK_CONCURRENCY)
+            priority: Rate-limiter lane (bulk work is BACKGROUND by default)
+            
+        Yields:
+            BulkResult for every requested city
+        """
+        semaphore = asyncio.Semaphore(concurrency or Config.BULK_CONCURRENCY)
+        cities = list(dict.fromkeys(cities))
+        ids = [c for c in cities if isinstance(c, int)]
+        names = [c for c in cities if not isinstance(c, int)]
+        
+        jobs = [
+            self._bulk_group(ids[i:i + Config.GROUP_MAX_IDS], semaphore, priority)
+            for i in range(0, len(ids), Config.GROUP_MAX_IDS)
+        ]
+        jobs += [
+            self._bulk_one(self.get_weather, name, semaphore, priority)
+            for name in names
+        ]
+        
+        async for result in self._bulk_stream(jobs):
+            yield result
+    
+    async def get_forecast_many(
+        self,
+        cities: Iterable[CityRef],
+        concurrency: Optional[int] = None,
+        priority: int = BACKGROUND,
+    ) -> AsyncIterator[BulkResult]:
+        """
+        Fetch 5-day forecasts for many cities.
+        
+        OWM has no group endpoint for forecasts, so each city is one
+        request, with at most `concurrency` in flight. Results are
+        yielded as they complete, with per-city errors.
+        
+        Args:
+            cities: City names and/or OpenWeatherMap city IDs
+            concurrency: Max parallel requests (default Config.BULK_CONCURRENCY)
+            priority: Rate-limiter lane (bulk work is BACKGROUND by default)
+            
+        Yields:
+            BulkResult for every requested city
+        """
+        semaphore = asyncio.Semaphore(concurrency or Config.BULK_CONCURRENCY)
+        jobs = [
+            self._bulk_one(self.get_forecast, city, semaphore, priority)
+            for city in dict.fromkeys(cities)
+        ]
+        
+        async for result in self._bulk_stream(jobs):
+            yield result
+    
+    @staticmethod
+    async def _bulk_stream(jobs: List[Awaitable[List[BulkResult]]]) -> AsyncIterator[BulkResult]:
+        """Yield results from bulk jobs in completion order."""
+        tasks = [asyncio.ensure_future(job) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for result in await next_done:
+                    yield result
+        finally:
+            # Caller stopped iterating early: drop the remaining requests.
+            # Cancelling a job cancels its shared request too (see _coalesce)
+            # unless another caller still waits for it.
+            for task in tasks:
+                task.cancel()
+    
+    @staticmethod
+    async def _bulk_one(
+        fetch: Callable[[CityRef, int], Awaitable[Dict]],
+        city: CityRef,
+        semaphore: asyncio.Semaphore,
+        priority: int,
+    ) -> List[BulkResult]:
+        """Fetch a single city under the bulk semaphore."""
+        async with semaphore:
+            try:
+                return [BulkResult(city, await fetch(city, priority), None)]
+            except WeatherServiceError as e:
+                return [BulkResult(city, None, e)]
+            except Exception as e:
+                return [BulkResult(city, None, WeatherServiceError(
+                    f"Error fetching weather data: {str(e)}"
+                ))]
+    
+    async def _bulk_group(
+        self,
+        city_ids: List[int],
+        semaphore: asyncio.Semaphore,
+        priority: int,
+    ) -> List[BulkResult]:
+        """Fetch current weather for up to GROUP_MAX_IDS city IDs in one request."""
+        params = {
+            "id": ",".join(str(city_id) for city_id in city_ids),
+            "appid": self.api_key,
+            "units": Config.UNITS,
+        }
+        
+        async with semaphore:
+            try:
+                response = await self._get(Config.GROUP_URL, params, priority)
+                response.raise_for_status()
+                found = {item.get("id"): item for item in response.json().get("list", [])}
+            except WeatherServiceError as error:
+                return [BulkResult(city_id, None, error) for city_id in city_ids]
+            except Exception as e:
+                error = WeatherServiceError(f"Error fetching weather data: {str(e)}")
+                return [BulkResult(city_id, None, error) for city_id in city_ids]
+        
+        return [
+            BulkResult(city_id, found[city_id], None) if city_id in found
+            else BulkResult(city_id, None, WeatherServiceError(
+                f"City ID {city_id} not found."
+            ))
+            for city_id in city_ids
+        ]